@@ -0,0 +1,227 @@
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from database import pool_stats
+from sessions import verify_token
+import config
+
+# -----------------------------
+# Settings
+# -----------------------------
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "1") == "1"
+# Only behind a proxy that sets it: otherwise clients pick their own bucket
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") == "1"
+# Buckets kept in memory; the least recently used are evicted first
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+# Pool queue lengths (acquires the pool cannot serve yet, per worker; see
+# PoolStats.queued) at which each priority starts being shed with 503
+SHED_WAITING_LOW = int(os.getenv("SHED_WAITING_LOW", str(config.DB_POOL_MAX_SIZE)))
+SHED_WAITING_NORMAL = int(os.getenv("SHED_WAITING_NORMAL", str(2 * config.DB_POOL_MAX_SIZE)))
+SHED_WAITING_CRITICAL = int(os.getenv("SHED_WAITING_CRITICAL", str(4 * config.DB_POOL_MAX_SIZE)))
+
+
+def _budget(name: str, default: str) -> tuple[float, float]:
+    """RATE_LIMIT_<NAME>="<tokens per second>/<burst>"."""
+    rate, _, burst = os.getenv(f"RATE_LIMIT_{name.upper()}", default).partition("/")
+    return float(rate), float(burst or rate)
+
+
+# (name, method, path, key, budget). "ip" buckets are per client address;
+# "user" buckets are per session user, falling back to the address.
+RATE_LIMITS = [
+    ("login", "POST", "/api/login", "ip", _budget("login", "5/20")),
+    ("register", "POST", "/api/register", "ip", _budget("register", "1/5")),
+    ("checkout", "POST", "/order", "user", _budget("checkout", "2/10")),
+]
+
+CRITICAL, NORMAL, LOW = "critical", "normal", "low"
+SHED_THRESHOLDS = {LOW: SHED_WAITING_LOW, NORMAL: SHED_WAITING_NORMAL, CRITICAL: SHED_WAITING_CRITICAL}
+
+# (method or None for any, path prefix, priority), first match wins; anything
+# else is NORMAL. None as the priority means never shed.
+PRIORITIES = [
+    (None, "/health", None),
+    (None, "/metrics", None),
+    ("POST", "/order", CRITICAL),
+    (None, "/cart", CRITICAL),
+    (None, "/feedback", LOW),
+    ("GET", "/stock", LOW),
+]
+
+
+# -----------------------------
+# Token buckets
+# -----------------------------
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "full_after")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.full_after = burst / rate  # idle seconds until it refills completely
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by (rule, client) in an LRU. A check is O(1): refill
+    by the time elapsed since the last one, then take a token. A bucket idle
+    for burst / rate seconds is full again, so dropping it loses nothing;
+    those are evicted from the cold end as new buckets arrive, and the LRU
+    size cap bounds memory under a flood of distinct clients. Only the event
+    loop touches it, so there is no lock.
+    """
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()  # (rule, client) -> TokenBucket
+        self.limited = {}  # rule -> rejected requests
+        self.evicted = 0
+
+    def take(self, rule: str, client: str, rate: float, burst: float) -> float:
+        """Take one token; return 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        key = (rule, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            self._evict(now)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        self.limited[rule] = self.limited.get(rule, 0) + 1
+        return (1 - bucket.tokens) / rate
+
+    def _evict(self, now: float):
+        # At most two idle buckets per insert keeps each check O(1)
+        for _ in range(2):
+            if len(self._buckets) <= 1:
+                return
+            bucket = next(iter(self._buckets.values()))
+            if now - bucket.updated < bucket.full_after:
+                break
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "evicted": self.evicted, "limited": dict(self.limited)}
+
+
+rate_limiter = RateLimiter()
+shed_counts = {LOW: 0, NORMAL: 0, CRITICAL: 0}
+
+
+def stats() -> dict:
+    return {**rate_limiter.stats(), "shed": dict(shed_counts), "pool_queued": pool_stats.queued()}
+
+
+# -----------------------------
+# Request classification
+# -----------------------------
+def _header(scope, wanted: bytes) -> str | None:
+    for name, value in scope["headers"]:
+        if name == wanted:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def client_user(scope) -> str:
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        claims = verify_token(authorization[7:].strip())
+        if claims is not None:
+            return f"user:{claims['uid']}"
+    return client_ip(scope)
+
+
+def _matches(path: str, prefix: str) -> bool:
+    return path == prefix or path.startswith(prefix + "/")
+
+
+def priority_for(method: str, path: str) -> str | None:
+    for rule_method, prefix, priority in PRIORITIES:
+        if (rule_method is None or rule_method == method) and _matches(path, prefix):
+            return priority
+    return NORMAL
+
+
+def rate_limit_for(method: str, path: str):
+    path = path.rstrip("/")
+    for name, rule_method, rule_path, key, budget in RATE_LIMITS:
+        if method == rule_method and path == rule_path:
+            return name, key, budget
+    return None
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware that rejects work before it reaches the database.
+    While the pool's wait queue is long, low-priority routes (feedback,
+    catalog reads) get 503 first, then normal ones, and checkout only once
+    the queue passes SHED_WAITING_CRITICAL. Routes in RATE_LIMITS then get
+    429 when the client's token bucket is empty.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+
+        if LOAD_SHEDDING_ENABLED:
+            priority = priority_for(method, path)
+            if priority is not None and pool_stats.queued() >= SHED_THRESHOLDS[priority]:
+                shed_counts[priority] += 1
+                await _reject(send, 503, "Server busy, retry shortly", 1)
+                return
+
+        if RATE_LIMIT_ENABLED:
+            rule = rate_limit_for(method, path)
+            if rule is not None:
+                name, key, (rate, burst) = rule
+                client = client_user(scope) if key == "user" else client_ip(scope)
+                wait = rate_limiter.take(name, client, rate, burst)
+                if wait:
+                    await _reject(send, 429, "Too many requests", wait)
+                    return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from database import transaction, query_one, query_all, query_val, query_exec
+import queries as q
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_REFRESH_INTERVAL = float(os.getenv("ANALYTICS_REFRESH_INTERVAL", "30"))
+ANALYTICS_BATCH = int(os.getenv("ANALYTICS_BATCH", "5000"))
+# Orders younger than this are left for the next run (see REFRESH_SALES_ROLLUP)
+ANALYTICS_LAG = float(os.getenv("ANALYTICS_LAG", "30"))
+
+
+# -----------------------------
+# Rollup refresh
+# -----------------------------
+class RollupRefresher:
+    """
+    Background task that folds new orders into sales_daily and sales_by_stock
+    every ANALYTICS_REFRESH_INTERVAL seconds, ANALYTICS_BATCH orders per
+    transaction, advancing the watermark as it goes. Each batch holds a
+    transaction-level advisory lock, so with several workers only one of them
+    moves the watermark and no order is counted twice.
+
+    Rollups count orders as they were placed; after editing or deleting old
+    orders, rebuild() recomputes them from scratch.
+    """
+
+    def __init__(self, interval: float = ANALYTICS_REFRESH_INTERVAL, batch: int = ANALYTICS_BATCH):
+        self.interval = interval
+        self.batch = batch
+        self.runs = 0
+        self.orders = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _refresh_batch(self) -> int | None:
+        """Fold one batch; None if another worker holds the lock."""
+        async with transaction():
+            if not await query_val(q.TRY_ROLLUP_LOCK):
+                return None
+            row = await query_one(q.REFRESH_SALES_ROLLUP, lag=ANALYTICS_LAG, limit=self.batch)
+        return row["orders"] if row else 0
+
+    async def refresh(self) -> int:
+        """Catch the rollups up to the watermark lag; orders folded in."""
+        start = time.perf_counter()
+        folded = 0
+        while True:
+            count = await self._refresh_batch()
+            if count is None:
+                self.skipped += 1
+                break
+            folded += count
+            if count < self.batch:
+                break
+        self.runs += 1
+        self.orders += folded
+        self.last_duration = time.perf_counter() - start
+        return folded
+
+    async def rebuild(self) -> int:
+        """Empty the rollups, reset the watermark and refold every order."""
+        async with transaction():
+            await query_val(q.ROLLUP_LOCK)  # wait for a running batch
+            await query_exec(q.RESET_SALES_ROLLUP)
+        return await self.refresh()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Sales rollup refresh failed")
+            await asyncio.sleep(self.interval)
+
+    async def stats(self) -> dict:
+        watermark = await query_one(q.GET_SALES_WATERMARK)
+        return {
+            "runs": self.runs,
+            "orders": self.orders,
+            "skipped": self.skipped,
+            "last_duration_ms": round(self.last_duration * 1000, 2),
+            "lag_seconds": ANALYTICS_LAG,
+            "watermark": watermark,
+        }
+
+
+rollup_refresher = RollupRefresher()
+
+
+# -----------------------------
+# Reports
+# -----------------------------
+def date_range(start: date | None, end: date | None, days: int) -> tuple[date, date]:
+    """Default to the `days` days ending today (UTC), inclusive."""
+    end = end or datetime.utcnow().date()
+    return start or end - timedelta(days=days - 1), end
+
+
+async def revenue_by_day(start: date, end: date) -> list[dict]:
+    return await query_all(q.GET_REVENUE_BY_DAY, start=start, end=end)
+
+
+async def top_stock(start: date, end: date, limit: int) -> list[dict]:
+    return await query_all(q.GET_TOP_STOCK, start=start, end=end, limit=limit)
+
+
+async def stock_sales(stock_id: int, start: date, end: date) -> list[dict]:
+    return await query_all(q.GET_STOCK_SALES, stock_id=stock_id, start=start, end=end)
+
+
+async def low_stock(threshold: int, days: int, cover_days: int, limit: int) -> list[dict]:
+    return await query_all(
+        q.GET_LOW_STOCK, threshold=threshold, days=days, cover_days=cover_days, limit=limit
+    )
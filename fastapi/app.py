@@ -1,30 +1,81 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import users , stock, order , feedback
-from database import connect_db, disconnect_db
+from routes import users , stock, order , feedback, health, metrics, cart, analytics
+from database import connect_db, disconnect_db, warm_pool
+from migrate import migrate_database, MIGRATE_ON_STARTUP
+from cache import catalog_cache
+from search import trigram_index, AUTOCOMPLETE_INDEX
+from feedback_queue import feedback_writer
+from holds import hold_sweeper
+from analytics import rollup_refresher
+from instrumentation import InstrumentationMiddleware, loop_lag
+from response_policy import ResponsePolicyMiddleware
+from admission import AdmissionMiddleware
+import logging
+import passwords
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+async def warm_up():
+    """Fill the pool's statement caches and the in-process caches before the
+    first request; a failure here is logged, not fatal."""
+    try:
+        await warm_pool()
+        await catalog_cache.get(stock.load_catalog)
+        if AUTOCOMPLETE_INDEX:
+            await trigram_index.ensure_fresh()
+        passwords.get_executor()
+    except Exception:
+        logger.exception("Warm-up failed; continuing cold")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_db()
+    if MIGRATE_ON_STARTUP:
+        # Workers take turns on an advisory lock; all but the first find
+        # nothing pending
+        await migrate_database()
+    await warm_up()
+    await feedback_writer.start()
+    await hold_sweeper.start()
+    await rollup_refresher.start()
+    await loop_lag.start()
+    yield
+    # The server has drained in-flight requests by now. Flush queued
+    # feedback while the pool is still open.
+    await loop_lag.stop()
+    await rollup_refresher.stop()
+    await hold_sweeper.stop()
+    await feedback_writer.stop()
+    await disconnect_db()
+    passwords.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Middleware
+app.add_middleware(AdmissionMiddleware)  # inside CORS so 429/503 stay readable
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # adjust in production
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Latest-Cursor", "Idempotent-Replayed", "Retry-After"],
 )
+app.add_middleware(ResponsePolicyMiddleware)
+app.add_middleware(InstrumentationMiddleware)  # outermost: timings include compression
 
 # Include routes
 app.include_router(users.router, prefix="/api", tags=["users"])
 app.include_router(stock.router, prefix="/stock", tags=["stock"])
 app.include_router(order.router, prefix="/order", tags=["orders"])
+app.include_router(cart.router, prefix="/cart", tags=["cart"])
 app.include_router(feedback.router, prefix="/feedback", tags=["feedback"])
+app.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+app.include_router(metrics.router, tags=["metrics"])
 
-
-@app.on_event("startup")
-async def startup():
-    await connect_db()
-
-@app.on_event("shutdown")
-async def shutdown():
-    await disconnect_db()
@@ -0,0 +1,110 @@
+"""
+CPU cost of encoding list responses: response_model validation vs. the
+FAST_JSON serializer, at 1k and 10k rows.
+
+Mounts the real response models on a throwaway FastAPI app that returns
+synthetic rows shaped like asyncpg records, so only serialization is
+measured (no database needed).
+
+    python bench/serialize_bench.py
+    python bench/serialize_bench.py --rows 1000 10000 50000 --repeat 20
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from routes.order import OrderOut  # noqa: E402
+from routes.stock import StockOut  # noqa: E402
+from serializers import fast_json_response, orjson  # noqa: E402
+
+
+def order_rows(n: int, rng: random.Random) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "order_id": i, "user_id": rng.randint(1, 1000), "address_id": rng.randint(1, 1000),
+            "total_price": Decimal(f"{rng.uniform(1000, 90000):.2f}"),
+            "items": [{"stock_id": rng.randint(1, 500), "quantity": rng.randint(1, 3),
+                       "price": round(rng.uniform(1000, 30000), 2)} for _ in range(rng.randint(1, 4))],
+            "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def stock_rows(n: int, rng: random.Random) -> list[dict]:
+    return [
+        {"stock_id": i, "name": f"Drone {i}", "description": f"Synthetic drone number {i}",
+         "price": Decimal(f"{rng.uniform(1000, 60000):.2f}"), "quantity": rng.randint(0, 500)}
+        for i in range(1, n + 1)
+    ]
+
+
+def build_app(datasets: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/orders/{n}/model", response_model=List[OrderOut])
+    async def orders_model(n: int):
+        return datasets["orders"][n]
+
+    @app.get("/orders/{n}/fast")
+    async def orders_fast(n: int):
+        return fast_json_response(datasets["orders"][n], OrderOut)
+
+    @app.get("/stock/{n}/model", response_model=List[StockOut])
+    async def stock_model(n: int):
+        return datasets["stock"][n]
+
+    @app.get("/stock/{n}/fast")
+    async def stock_fast(n: int):
+        return fast_json_response(datasets["stock"][n], StockOut)
+
+    return app
+
+
+def measure(client: TestClient, path: str, repeat: int) -> float:
+    """Median CPU seconds per request."""
+    client.get(path)  # warm up (compiles the serializer, builds validators)
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        response = client.get(path)
+        samples.append(time.process_time() - start)
+        response.raise_for_status()
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    datasets = {
+        "orders": {n: order_rows(n, rng) for n in args.rows},
+        "stock": {n: stock_rows(n, rng) for n in args.rows},
+    }
+    client = TestClient(build_app(datasets))
+    print(f"encoder: {'orjson' if orjson else 'stdlib json'}")
+    print(f"{'endpoint':<10}{'rows':>8}{'model ms':>12}{'fast ms':>12}{'speed-up':>10}")
+    for kind in ("orders", "stock"):
+        for n in args.rows:
+            model = measure(client, f"/{kind}/{n}/model", args.repeat)
+            fast = measure(client, f"/{kind}/{n}/fast", args.repeat)
+            print(f"{kind:<10}{n:>8}{model * 1000:>12.1f}{fast * 1000:>12.1f}{model / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+CPU cost of session token checks, per call: issuing, verifying a valid,
+forged, expired or revoked token, and the `current_session` dependency
+including header parsing. The revocation list is filled to
+REVOKED_TOKENS_MAX first, so lookups run at full size.
+
+    python bench/session_bench.py
+    python bench/session_bench.py --number 200000 --revoked 100000
+"""
+import argparse
+import sys
+import time
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import sessions  # noqa: E402
+from sessions import issue_token, verify_token, revoke_token, current_session  # noqa: E402
+
+
+def per_call(fn, number: int, repeat: int = 5) -> float:
+    """Best of `repeat` runs, in microseconds per call."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=100_000, help="calls per timing run")
+    parser.add_argument("--revoked", type=int, default=sessions.REVOKED_TOKENS_MAX,
+                        help="revoked tokens held during the run")
+    args = parser.parse_args()
+
+    exp = int(time.time()) + sessions.SESSION_TTL
+    for i in range(args.revoked):
+        sessions.revoked.add(f"bench-{i}", exp)
+
+    valid = issue_token(1)
+    payload, _, signature = valid.partition(".")
+    forged = f"{payload}.{signature[::-1]}"
+    expired = issue_token(1, ttl=-1)
+    revoked = issue_token(1)
+    revoke_token(revoked)
+    header = f"Bearer {valid}"
+
+    cases = [
+        ("issue", lambda: issue_token(1)),
+        ("verify valid", lambda: verify_token(valid)),
+        ("verify forged", lambda: verify_token(forged)),
+        ("verify expired", lambda: verify_token(expired)),
+        ("verify revoked", lambda: verify_token(revoked)),
+        ("current_session", lambda: current_session(header)),
+    ]
+    print(f"revoked tokens held: {len(sessions.revoked):,}")
+    print(f"{'operation':<18}{'us/call':>10}{'calls/s':>14}")
+    for name, fn in cases:
+        us = per_call(fn, args.number)
+        print(f"{name:<18}{us:>10.2f}{1e6 / us:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
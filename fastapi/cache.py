@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import os
+import time
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+# 0 loads the catalog on every request (ETags still work); for benchmarks
+CATALOG_CACHE = os.getenv("CATALOG_CACHE", "1") == "1"
+
+
+class CatalogCache:
+    """
+    Read-through cache for the encoded stock catalog.
+
+    Holds one JSON body plus its ETag. A miss runs the loader once while other
+    callers wait on the same lock; writes call invalidate() so the next read
+    reloads. A load that overlaps an invalidation is not stored.
+    """
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, enabled: bool = CATALOG_CACHE):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._body = None
+        self._etag = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._body is not None and time.monotonic() < self._expires_at
+
+    async def get(self, loader):
+        """Return (body, etag), calling `await loader()` -> bytes on a miss."""
+        if not self.enabled:
+            self.misses += 1
+            body = await loader()
+            return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self._fresh():
+            self.hits += 1
+            return self._body, self._etag
+
+        async with self._lock:
+            # Another request may have filled the cache while we waited
+            if self._fresh():
+                self.hits += 1
+                return self._body, self._etag
+
+            self.misses += 1
+            generation = self._generation
+            body = await loader()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if generation == self._generation:
+                self._body, self._etag = body, etag
+                self._expires_at = time.monotonic() + self.ttl
+            return body, etag
+
+    def invalidate(self):
+        self._generation += 1
+        self._body = None
+        self._etag = None
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "ttl": self.ttl,
+            "enabled": self.enabled,
+            "cached": self._fresh(),
+        }
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True if an If-None-Match header value matches `etag`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag in tags
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,87 @@
+from fastapi.encoders import jsonable_encoder
+from database import transaction, query_one, query_all, query_exec, insert_order
+from cache import catalog_cache
+from idempotency import idempotency_store, IdempotencyConflict, IDEMPOTENCY_TTL
+import queries as q
+
+
+class CheckoutError(Exception):
+    """Raised when an order cannot be placed; nothing has been written."""
+
+    def __init__(self, missing: list[int], short: list[int]):
+        self.missing = missing  # stock_ids that do not exist
+        self.short = short      # stock_ids without enough quantity
+        super().__init__(f"missing={missing} short={short}")
+
+
+# -----------------------------
+# Checkout
+# -----------------------------
+def check_reserved(rows) -> None:
+    """Raise CheckoutError unless every requested line was reserved."""
+    missing = [r["stock_id"] for r in rows if not r["found"]]
+    short = [r["stock_id"] for r in rows if r["found"] and not r["reserved"]]
+    if missing or short:
+        raise CheckoutError(missing, short)
+
+
+async def place_order(user_id: int, address_id: int, total_price: float, items: list[dict]):
+    order, _ = await _checkout(user_id, address_id, total_price, items)
+    return order
+
+
+async def place_order_once(
+    key: str, request_hash: str, user_id: int, address_id: int, total_price: float, items: list[dict]
+) -> tuple[dict, bool]:
+    """
+    place_order() guarded by an Idempotency-Key. Returns (order, replayed);
+    a replay is the stored response of the first attempt and touches no stock.
+    """
+    return await idempotency_store.run(
+        user_id, key, request_hash,
+        lambda: _checkout(user_id, address_id, total_price, items, key, request_hash),
+    )
+
+
+async def _checkout(user_id, address_id, total_price, items, key=None, request_hash=None):
+    """
+    Take the items from the user's stock holds, decrement stock for whatever
+    the holds do not cover, and insert the order in one transaction.
+    A cart fully covered by holds never locks a stock row. At most three
+    round trips regardless of cart size (five with an idempotency key); any
+    shortage rolls everything back, including the key claim.
+    """
+    async with transaction():
+        if key is not None:
+            claimed = await query_one(
+                q.CLAIM_IDEMPOTENCY_KEY, user_id=user_id, key=key, request_hash=request_hash, ttl=IDEMPOTENCY_TTL
+            )
+            if claimed is None:
+                stored = await query_one(q.GET_IDEMPOTENCY_KEY, user_id=user_id, key=key)
+                if stored["request_hash"] != request_hash:
+                    raise IdempotencyConflict()
+                return stored["response"], True
+
+        remaining = await query_all(
+            q.CONSUME_HOLDS,
+            user_id=user_id,
+            stock_ids=[item["stock_id"] for item in items],
+            quantities=[item["quantity"] for item in items],
+        )
+        needed = [r for r in remaining if r["remaining"] > 0]
+        if needed:
+            rows = await query_all(
+                q.RESERVE_STOCK,
+                stock_ids=[r["stock_id"] for r in needed],
+                quantities=[r["remaining"] for r in needed],
+            )
+            check_reserved(rows)
+        order = await insert_order(user_id, address_id, total_price, items)
+        if key is not None:
+            order = jsonable_encoder(order)
+            await query_exec(q.SAVE_IDEMPOTENT_RESPONSE, user_id=user_id, key=key, response=order)
+
+    # Quantities changed, so the cached catalog is stale
+    if needed:
+        catalog_cache.invalidate()
+    return order, False
@@ -0,0 +1,57 @@
+import os
+
+# -----------------------------
+# Database connection
+# -----------------------------
+POSTGRES_USER = os.getenv("POSTGRES_USER", "temp")
+POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "temp")
+POSTGRES_DB = os.getenv("POSTGRES_DB", "drone")
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "db")
+POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}",
+)
+
+# -----------------------------
+# Server processes (serve.py)
+# -----------------------------
+# Worker processes per instance; defaults to one per core
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+
+# -----------------------------
+# Pool sizing (per worker process)
+# -----------------------------
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Connections for the whole instance. When set, every worker gets an equal
+# share instead of DB_POOL_MAX_SIZE, so adding workers never exceeds what
+# Postgres was sized for.
+DB_POOL_BUDGET = int(os.getenv("DB_POOL_BUDGET", "0"))
+if DB_POOL_BUDGET:
+    DB_POOL_MAX_SIZE = max(1, DB_POOL_BUDGET // WEB_CONCURRENCY)
+    DB_POOL_MIN_SIZE = min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+# Idle connections above min_size are closed after this many seconds
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+
+# -----------------------------
+# Timeouts and startup retry
+# -----------------------------
+# Server-side limit applied to every statement, in milliseconds (0 = none)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "10"))
+DB_CONNECT_BACKOFF = float(os.getenv("DB_CONNECT_BACKOFF", "0.5"))
+DB_CONNECT_BACKOFF_MAX = float(os.getenv("DB_CONNECT_BACKOFF_MAX", "10"))
+
+
+def pool_options() -> dict:
+    """Keyword arguments forwarded by `databases` to asyncpg.create_pool()."""
+    return {
+        "min_size": DB_POOL_MIN_SIZE,
+        "max_size": DB_POOL_MAX_SIZE,
+        "max_inactive_connection_lifetime": DB_POOL_MAX_INACTIVE_LIFETIME,
+        "timeout": DB_CONNECT_TIMEOUT,
+        "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+    }
@@ -1,122 +1,350 @@
+from contextlib import asynccontextmanager
 from databases import Database
+import databases
 from datetime import datetime
+from metrics import Histogram
+from instrumentation import record_query
+from singleflight import single_flight
+import asyncio
+import asyncpg
 import json
+import logging
+import time
+import config
+import queries as q
 
-POSTGRES_USER = "temp"
-POSTGRES_PASSWORD = "temp"
-POSTGRES_DB = "drone"
-POSTGRES_HOST = "db"
+logger = logging.getLogger(__name__)
 
-DATABASE_URL = f'postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}/{POSTGRES_DB}'
+DATABASE_URL = config.DATABASE_URL
+
+async def init_connection(connection):
+    """
+    Runs once per new pooled connection: decode json/jsonb natively and
+    attribute query count and time to the current request.
+    """
+    for typename in ("json", "jsonb"):
+        await connection.set_type_codec(
+            typename, encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+    connection.add_query_logger(record_query)
+
+
+database = Database(DATABASE_URL, init=init_connection, **config.pool_options())
+
+
+# -----------------------------
+# Pool metrics
+# -----------------------------
+class PoolStats:
+    """
+    Tracks how long requests wait to check a connection out of the pool.
+    asyncpg's Pool cannot be patched (it uses __slots__), so acquires are
+    timed in `connection()` below, which every helper goes through.
+    """
+
+    def __init__(self):
+        self.acquire_wait = Histogram(buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+        self.waiting = 0
+        self.timeouts = 0
+        self.pool = None
+
+    @asynccontextmanager
+    async def timed_acquire(self):
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            yield
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+            self.acquire_wait.observe(time.perf_counter() - start)
+
+    def queued(self) -> int:
+        """
+        Acquires that the pool cannot serve right now: waiters beyond its
+        idle connections plus the room it still has to grow. Acquires that an
+        idle connection is about to satisfy are not counted.
+        """
+        pool = self.pool
+        if pool is None or not self.waiting:
+            return 0
+        size = pool.get_size()
+        available = pool.get_idle_size() + pool.get_max_size() - size
+        return max(0, self.waiting - available)
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        if pool is None:
+            return {"connected": False}
+        size, idle = pool.get_size(), pool.get_idle_size()
+        return {
+            "connected": True,
+            "min_size": pool.get_min_size(),
+            "max_size": pool.get_max_size(),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "waiting": self.waiting,
+            "queued": self.queued(),
+            "acquire_timeouts": self.timeouts,
+            "acquire_wait_seconds": self.acquire_wait.snapshot(),
+        }
+
+
+pool_stats = PoolStats()
+
+
+# databases exposes neither its asyncpg pool nor whether the task already
+# holds a connection, so these read its private attributes. They are checked
+# against the version pinned in requirements.txt; an upgrade that moves them
+# fails here instead of quietly breaking pool metrics and warm-up.
+def _databases_private(obj, attr: str):
+    try:
+        return getattr(obj, attr)
+    except AttributeError:
+        raise RuntimeError(
+            f"{type(obj).__name__}.{attr} not found in databases {databases.__version__}; "
+            "database.py needs the version pinned in requirements.txt"
+        ) from None
+
+
+def _asyncpg_pool() -> asyncpg.Pool:
+    return _databases_private(_databases_private(database, "_backend"), "_pool")
 
-database = Database(DATABASE_URL)
 
 async def connect_db():
-    await database.connect()
+    """Connect, retrying with exponential backoff while Postgres starts up."""
+    delay = config.DB_CONNECT_BACKOFF
+    for attempt in range(1, config.DB_CONNECT_RETRIES + 1):
+        try:
+            await database.connect()
+            break
+        except (OSError, asyncio.TimeoutError, asyncpg.CannotConnectNowError) as e:
+            if attempt == config.DB_CONNECT_RETRIES:
+                raise
+            logger.warning("Database connect attempt %d failed (%s); retrying in %.1fs", attempt, e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.DB_CONNECT_BACKOFF_MAX)
+    pool_stats.pool = _asyncpg_pool()
     print("Database connected")
 
+# Hot read statements run once on every pooled connection at startup, with
+# keys that match nothing, so the first real requests skip parse/plan
+WARM_QUERIES = [
+    (q.GET_ALL_STOCK, {}),
+    (q.GET_STOCK, {"stock_id": 0}),
+    (q.GET_USER_BY_EMAIL, {"email": ""}),
+    (q.GET_ADDRESS, {"user_id": 0}),
+    (q.GET_CHECKOUT_CONTEXT, {"user_id": 0}),
+    (q.GET_ORDER, {"order_id": 0}),
+    (q.GET_USER_ORDERS, {"user_id": 0, "limit": 1}),
+    (q.GET_FEEDBACK_FEED, {"limit": 1}),
+    (q.GET_FEEDBACK_STATS, {}),
+]
+
+async def warm_pool():
+    """Prepare WARM_QUERIES on each of the pool's min_size connections."""
+    pool = _asyncpg_pool()
+    # Hold them all at once so every statement lands on a different connection
+    connections = [await pool.acquire() for _ in range(config.DB_POOL_MIN_SIZE)]
+    try:
+        for connection in connections:
+            for query, values in WARM_QUERIES:
+                await connection.fetch(query.sql, *query.args(values))
+    finally:
+        for connection in connections:
+            await pool.release(connection)
+
 async def disconnect_db():
     await database.disconnect()
+    pool_stats.pool = None
     print("Database disconnected")
 
 
+# -----------------------------
+# Connections
+# -----------------------------
+@asynccontextmanager
+async def connection():
+    """
+    `database.connection()` that records the pool wait in pool_stats when it
+    checks a connection out; re-entering the task's held connection (e.g.
+    inside a transaction) is not counted.
+    """
+    conn = database.connection()
+    if _databases_private(conn, "_connection_counter") == 0:
+        async with pool_stats.timed_acquire():
+            await conn.__aenter__()
+    else:
+        await conn.__aenter__()
+    try:
+        yield conn
+    finally:
+        await conn.__aexit__()
+
+
+@asynccontextmanager
+async def transaction():
+    """`database.transaction()` on a connection checked out by `connection()`."""
+    async with connection():
+        async with database.transaction():
+            yield
+
+
+# -----------------------------
+# Registry execution
+# -----------------------------
+# Statements live in queries.py. These helpers run them on the connection
+# bound to the current task (so they join any open `transaction()`) and
+# always decode rows to plain dicts.
+
+async def query_one(query: q.Query, **values) -> dict | None:
+    async with connection() as conn:
+        row = await conn.raw_connection.fetchrow(query.sql, *query.args(values))
+    return dict(row) if row is not None else None
+
+async def query_all(query: q.Query, **values) -> list[dict]:
+    async with connection() as conn:
+        rows = await conn.raw_connection.fetch(query.sql, *query.args(values))
+    return [dict(row) for row in rows]
+
+async def query_val(query: q.Query, **values):
+    async with connection() as conn:
+        return await conn.raw_connection.fetchval(query.sql, *query.args(values))
+
+async def query_exec(query: q.Query, **values) -> str:
+    async with connection() as conn:
+        return await conn.raw_connection.execute(query.sql, *query.args(values))
+
+async def query_iter(query: q.Query, **values):
+    """Rows as dicts through a server-side cursor, one prefetch batch in memory."""
+    async with connection() as conn:
+        raw = conn.raw_connection
+        async with raw.transaction():
+            async for row in raw.cursor(query.sql, *query.args(values)):
+                yield dict(row)
+
+
 # -----------------------------
 # Users CRUD
 # -----------------------------
 async def insert_user(username: str, password_hash: str, email: str):
-    query = """
-    INSERT INTO users (username, password_hash, email)
-    VALUES (:username, :password_hash, :email)
-    RETURNING user_id, username, password_hash, email, created_at
-    """
-    values = {"username": username, "password_hash": password_hash, "email": email}
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(q.INSERT_USER, username=username, password_hash=password_hash, email=email)
+
+async def register_user(email: str, password_hash: str, name: str | None, surname: str | None):
+    return await query_one(
+        q.REGISTER_USER,
+        email=email, password_hash=password_hash, name=name, surname=surname,
+        created_at=datetime.utcnow(),
+    )
 
 async def get_user(user_id: int):
-    query = "SELECT * FROM users WHERE user_id = :user_id"
-    return await database.fetch_one(query=query, values={"user_id": user_id})
+    return await query_one(q.GET_USER, user_id=user_id)
+
+async def get_user_by_email(email: str):
+    return await query_one(q.GET_USER_BY_EMAIL, email=email)
 
 async def update_user(user_id: int, username: str, password_hash: str, email: str):
-    query = """
-    UPDATE users 
-    SET username = :username, password_hash = :password_hash, email = :email
-    WHERE user_id = :user_id
-    RETURNING user_id, username, password_hash, email, created_at
-    """
-    values = {"user_id": user_id, "username": username, "password_hash": password_hash, "email": email}
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(
+        q.UPDATE_USER, user_id=user_id, username=username, password_hash=password_hash, email=email
+    )
+
+async def update_user_name(user_id: int, name: str, surname: str):
+    return await query_one(q.UPDATE_USER_NAME, user_id=user_id, name=name, surname=surname)
+
+async def update_password_hash(user_id: int, password_hash: str):
+    return await query_exec(q.UPDATE_PASSWORD_HASH, user_id=user_id, password_hash=password_hash)
 
 async def delete_user(user_id: int):
-    query = "DELETE FROM users WHERE user_id = :user_id RETURNING *"
-    return await database.fetch_one(query=query, values={"user_id": user_id})
+    return await query_one(q.DELETE_USER, user_id=user_id)
 
 
 # -----------------------------
 # Address CRUD
 # -----------------------------
 async def insert_address(user_id: int, street: str, city: str, postal_code: str, country: str):
-    query = """
-    INSERT INTO address (user_id, street, city, postal_code, country)
-    VALUES (:user_id, :street, :city, :postal_code, :country)
-    RETURNING id, user_id, street, city, postal_code, country
-    """
-    values = {
-        "user_id": user_id,
-        "street": street,
-        "city": city,
-        "postal_code": postal_code,
-        "country": country,
-    }
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(
+        q.INSERT_ADDRESS,
+        user_id=user_id, street=street, city=city, postal_code=postal_code, country=country,
+    )
 
+@single_flight
 async def get_address(user_id: int):
-    query = "SELECT * FROM address WHERE user_id = :user_id"
-    return await database.fetch_all(query=query, values={"user_id": user_id})
+    return await query_all(q.GET_ADDRESS, user_id=user_id)
 
 async def update_address(id: int, street: str, city: str, postal_code: str, country: str):
-    query = """
-    UPDATE address
-    SET street=:street, city=:city, postal_code=:postal_code, country=:country
-    WHERE id=:id
-    RETURNING id, user_id, street, city, postal_code, country
-    """
-    values = {"id": id, "street": street, "city": city, "postal_code": postal_code, "country": country}
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(
+        q.UPDATE_ADDRESS, id=id, street=street, city=city, postal_code=postal_code, country=country
+    )
+
+async def upsert_default_address(user_id: int, street: str, city: str, postal_code: str, country: str):
+    return await query_one(
+        q.UPSERT_DEFAULT_ADDRESS,
+        user_id=user_id, street=street, city=city, postal_code=postal_code, country=country,
+    )
+
+class _Rollback(Exception):
+    """Raised inside a transaction to undo it; never leaves this module."""
+
+
+async def set_default_address(user_id: int, id: int):
+    """Make address `id` the user's default; None (old default kept) if it is not theirs."""
+    try:
+        async with transaction():
+            await query_exec(q.CLEAR_DEFAULT_ADDRESS, user_id=user_id, id=id)
+            row = await query_one(q.SET_DEFAULT_ADDRESS, user_id=user_id, id=id)
+            if row is None:
+                raise _Rollback()
+            return row
+    except _Rollback:
+        return None
 
 async def delete_address(id: int):
-    query = "DELETE FROM address WHERE id=:id RETURNING *"
-    return await database.fetch_one(query=query, values={"id": id})
+    return await query_one(q.DELETE_ADDRESS, id=id)
+
+@single_flight
+async def get_checkout_context(user_id: int):
+    return await query_one(q.GET_CHECKOUT_CONTEXT, user_id=user_id)
 
 
 # -----------------------------
 # Stock CRUD
 # -----------------------------
 async def insert_stock(name: str, description: str, price: float, quantity: int):
-    query = """
-    INSERT INTO stock (name, description, price, quantity)
-    VALUES (:name, :description, :price, :quantity)
-    RETURNING stock_id, name, description, price, quantity
-    """
-    values = {"name": name, "description": description, "price": price, "quantity": quantity}
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(q.INSERT_STOCK, name=name, description=description, price=price, quantity=quantity)
 
+@single_flight
 async def get_stock(stock_id: int):
-    query = "SELECT * FROM stock WHERE stock_id = :stock_id"
-    return await database.fetch_one(query=query, values={"stock_id": stock_id})
-
-async def update_stock(stock_id: int, name: str, description: str, price: float, quantity: int):
-    query = """
-    UPDATE stock
-    SET name=:name, description=:description, price=:price, quantity=:quantity
-    WHERE stock_id=:stock_id
-    RETURNING stock_id, name, description, price, quantity
-    """
-    values = {"stock_id": stock_id, "name": name, "description": description, "price": price, "quantity": quantity}
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(q.GET_STOCK, stock_id=stock_id)
+
+@single_flight
+async def get_all_stock():
+    return await query_all(q.GET_ALL_STOCK)
+
+def _stock_page(after, min_price, max_price, in_stock, limit) -> dict:
+    # -2**31: keyset start below any int stock_id
+    return {
+        "after": after if after is not None else -2**31,
+        "min_price": min_price, "max_price": max_price, "in_stock": in_stock, "limit": limit,
+    }
+
+async def list_stock(after: int | None, min_price: float | None, max_price: float | None,
+                     in_stock: bool, limit: int) -> list[dict]:
+    """One keyset page of stock after `after`, filters pushed into SQL."""
+    return await query_all(q.LIST_STOCK, **_stock_page(after, min_price, max_price, in_stock, limit))
+
+def iter_stock(after: int | None, min_price: float | None, max_price: float | None,
+               in_stock: bool, limit: int | None = None):
+    """list_stock() as a cursor-backed async iterator; no limit by default."""
+    return query_iter(q.LIST_STOCK, **_stock_page(after, min_price, max_price, in_stock, limit))
+
+async def get_all_stock_json() -> str:
+    return await query_val(q.GET_ALL_STOCK_JSON)
 
 async def delete_stock(stock_id: int):
-    query = "DELETE FROM stock WHERE stock_id=:stock_id RETURNING *"
-    return await database.fetch_one(query=query, values={"stock_id": stock_id})
+    return await query_one(q.DELETE_STOCK, stock_id=stock_id)
 
 
 # -----------------------------
@@ -124,98 +352,83 @@ async def delete_stock(stock_id: int):
 # -----------------------------
 
 async def insert_order(user_id: int, address_id: int, total_price: float, items: list):
-    query = """
-    INSERT INTO orders (user_id, address_id, total_price, items, created_at)
-    VALUES (:user_id, :address_id, :total_price, :items, :created_at)
-    RETURNING order_id, user_id, address_id, total_price, items, created_at
-    """
-    values = {
-        "user_id": user_id,
-        "address_id": address_id,
-        "total_price": total_price,
-        "items": json.dumps(items),
-        "created_at": datetime.utcnow(),
-    }
-    return await database.fetch_one(query=query, values=values)
-
-
+    return await query_one(
+        q.INSERT_ORDER,
+        user_id=user_id,
+        address_id=address_id,
+        total_price=total_price,
+        items=items,
+        created_at=datetime.utcnow(),
+    )
+
+
+# `items` is JSONB and arrives already decoded by the connection codec
+@single_flight
 async def get_order(order_id: int):
-    query = "SELECT * FROM orders WHERE order_id = :order_id"
-    order = await database.fetch_one(query=query, values={"order_id": order_id})
-    if order:
-        order = dict(order)
-        order["items"] = json.loads(order["items"])
-    return order
+    return await query_one(q.GET_ORDER, order_id=order_id)
 
 
-async def get_user_orders(user_id: int):
-    query = "SELECT * FROM orders WHERE user_id = :user_id"
-    rows = await database.fetch_all(query=query, values={"user_id": user_id})
-    orders = []
-    for row in rows:
-        row_dict = dict(row)
-        row_dict["items"] = json.loads(row_dict["items"])
-        orders.append(row_dict)
-    return orders
+async def get_user_orders(user_id: int, limit: int, before: tuple | None = None, summary: bool = False):
+    """
+    One page of a user's orders, newest first. `before` is the
+    (created_at, order_id) of the last row of the previous page.
+    """
+    if before is None:
+        query = q.GET_USER_ORDER_SUMMARIES if summary else q.GET_USER_ORDERS
+        return await query_all(query, user_id=user_id, limit=limit)
+    query = q.GET_USER_ORDER_SUMMARIES_BEFORE if summary else q.GET_USER_ORDERS_BEFORE
+    return await query_all(query, user_id=user_id, limit=limit, created_at=before[0], order_id=before[1])
 
 
 async def update_order(order_id: int, total_price: float, items: list):
-    query = """
-    UPDATE orders
-    SET total_price=:total_price, items=:items
-    WHERE order_id=:order_id
-    RETURNING order_id, user_id, address_id, total_price, created_at, items
-    """
-    values = {"order_id": order_id, "total_price": total_price, "items": json.dumps(items)}
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(q.UPDATE_ORDER, order_id=order_id, total_price=total_price, items=items)
 
 
 async def delete_order(order_id: int):
-    query = "DELETE FROM orders WHERE order_id=:order_id RETURNING *"
-    return await database.fetch_one(query=query, values={"order_id": order_id})
+    return await query_one(q.DELETE_ORDER, order_id=order_id)
 # -----------------------------
 # Feedback CRUD
 # -----------------------------
 async def insert_feedback(user_id: int, rating: int, comment: str = None):
-    query = """
-    INSERT INTO feedback (user_id, rating, comment)
-    VALUES (:user_id, :rating, :comment)
-    RETURNING feedback_id, user_id, rating, comment, created_at
-    """
-    values = {"user_id": user_id, "rating": rating, "comment": comment}
-    row = await database.fetch_one(query=query, values=values)
-    return row  # fetch_one already returns the inserted row
+    return await query_one(q.INSERT_FEEDBACK, user_id=user_id, rating=rating, comment=comment)
 
 async def get_feedback(feedback_id: int):
-    query = "SELECT * FROM feedback WHERE feedback_id = :feedback_id"
-    return await database.fetch_one(query=query, values={"feedback_id": feedback_id})
+    return await query_one(q.GET_FEEDBACK, feedback_id=feedback_id)
 
 async def get_all_feedback():
-    query = """
-    SELECT 
-        f.feedback_id, 
-        f.user_id, 
-        f.rating, 
-        f.comment, 
-        f.created_at,
-        u.name 
-    FROM feedback f
-    LEFT JOIN users u ON f.user_id = u.user_id
-    ORDER BY f.created_at DESC
+    return await query_all(q.GET_ALL_FEEDBACK)
+
+async def get_all_feedback_json() -> str:
+    return await query_val(q.GET_ALL_FEEDBACK_JSON)
+
+async def get_feedback_stats():
+    return await query_one(q.GET_FEEDBACK_STATS)
+
+async def get_feedback_feed(
+    limit: int, before: tuple | None = None, since: tuple | None = None, lag: float = 0.0
+):
+    """
+    One feed page; `before`/`since` are (created_at, feedback_id) cursors.
+    `since` leaves out entries younger than `lag` seconds.
     """
-    return await database.fetch_all(query=query)
+    if since is not None:
+        return await query_all(
+            q.GET_FEEDBACK_FEED_SINCE, limit=limit, created_at=since[0], feedback_id=since[1], lag=lag
+        )
+    if before is not None:
+        return await query_all(
+            q.GET_FEEDBACK_FEED_BEFORE, limit=limit, created_at=before[0], feedback_id=before[1]
+        )
+    return await query_all(q.GET_FEEDBACK_FEED, limit=limit)
+
+
+async def get_feedback_horizon(lag: float):
+    """created_at before which no more feedback can commit."""
+    return await query_val(q.GET_FEEDBACK_HORIZON, lag=lag)
 
 
 async def update_feedback(feedback_id: int, rating: int, comment: str = None):
-    query = """
-    UPDATE feedback
-    SET rating=:rating, comment=:comment
-    WHERE feedback_id=:feedback_id
-    RETURNING feedback_id, user_id, rating, comment, created_at
-    """
-    values = {"feedback_id": feedback_id, "rating": rating, "comment": comment}
-    return await database.fetch_one(query=query, values=values)
+    return await query_one(q.UPDATE_FEEDBACK, feedback_id=feedback_id, rating=rating, comment=comment)
 
 async def delete_feedback(feedback_id: int):
-    query = "DELETE FROM feedback WHERE feedback_id=:feedback_id RETURNING *"
-    return await database.fetch_one(query=query, values={"feedback_id": feedback_id})
+    return await query_one(q.DELETE_FEEDBACK, feedback_id=feedback_id)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+from database import query_one, query_all
+import queries as q
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "100"))
+FEEDBACK_FLUSH_INTERVAL = float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "0.05"))
+FEEDBACK_QUEUE_SIZE = int(os.getenv("FEEDBACK_QUEUE_SIZE", "10000"))
+# How long a submission may wait for queue space before it is rejected
+FEEDBACK_ENQUEUE_TIMEOUT = float(os.getenv("FEEDBACK_ENQUEUE_TIMEOUT", "0.5"))
+
+
+class QueueFull(Exception):
+    """The write-behind buffer stayed full for the whole enqueue timeout."""
+
+
+class FeedbackWriter:
+    """
+    Write-behind buffer for feedback inserts.
+
+    Submissions are queued and a single background task writes them in
+    multi-row batches, flushing when a batch is full or FEEDBACK_FLUSH_INTERVAL
+    has passed since its first row. Each submitter still gets its inserted row
+    back once its batch commits. A batch that fails is retried row by row, so
+    one bad submission only fails its own caller. stop() drains everything
+    that was accepted.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = FEEDBACK_BATCH_SIZE,
+        flush_interval: float = FEEDBACK_FLUSH_INTERVAL,
+        max_queue: int = FEEDBACK_QUEUE_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queue = None
+        self.batches = 0
+        self.written = 0
+        self.rejected = 0
+        self.retried = 0  # failed batches written row by row
+        self._task = None
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush every accepted submission, then stop the writer task."""
+        if self._task is None:
+            return
+        await self.queue.put(None)  # sentinel: drain and exit
+        await self._task
+        self._task = None
+
+    async def submit(self, user_id: int, rating: int, comment: str | None) -> dict:
+        if self._task is None:
+            raise RuntimeError("FeedbackWriter is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(
+                self.queue.put((user_id, rating, comment, future)), FEEDBACK_ENQUEUE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFull() from None
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # Anything queued behind the sentinel is flushed before exiting
+        batch = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        for i in range(0, len(batch), self.batch_size):
+            await self._flush(batch[i:i + self.batch_size])
+
+    async def _flush(self, batch: list):
+        try:
+            rows = await query_all(
+                q.INSERT_FEEDBACK_BATCH,
+                user_ids=[b[0] for b in batch],
+                ratings=[b[1] for b in batch],
+                comments=[b[2] for b in batch],
+            )
+        except Exception:
+            logger.exception("Feedback batch of %d rows failed; retrying row by row", len(batch))
+            self.retried += 1
+            for item in batch:
+                await self._insert_one(item)
+            return
+        self.batches += 1
+        self.written += len(rows)
+        for (*_, future), row in zip(batch, rows):
+            if not future.done():
+                future.set_result(row)
+
+    async def _insert_one(self, item: tuple):
+        user_id, rating, comment, future = item
+        try:
+            row = await query_one(q.INSERT_FEEDBACK, user_id=user_id, rating=rating, comment=comment)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        self.written += 1
+        if not future.done():
+            future.set_result(row)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "max_queue": self.max_queue,
+            "batches": self.batches,
+            "written": self.written,
+            "rejected": self.rejected,
+            "retried": self.retried,
+        }
+
+
+feedback_writer = FeedbackWriter()
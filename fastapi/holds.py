@@ -0,0 +1,180 @@
+import asyncio
+import asyncpg
+import logging
+import os
+from database import transaction, query_one, query_all, query_val, query_exec
+from cache import catalog_cache
+import queries as q
+
+logger = logging.getLogger(__name__)
+
+HOLD_TTL = float(os.getenv("HOLD_TTL", "900"))
+HOLD_SWEEP_INTERVAL = float(os.getenv("HOLD_SWEEP_INTERVAL", "15"))
+HOLD_SWEEP_BATCH = int(os.getenv("HOLD_SWEEP_BATCH", "1000"))
+
+
+class HoldUnavailable(Exception):
+    """The stock row is missing or has fewer free units than the hold needs."""
+
+    def __init__(self, stock_id: int, found: bool):
+        self.stock_id = stock_id
+        self.found = found
+        super().__init__(f"stock_id={stock_id} found={found}")
+
+
+class UnknownUser(Exception):
+    """The hold's user_id does not exist."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        super().__init__(f"user_id={user_id}")
+
+
+class HeldAboveStock(Exception):
+    """A write would leave fewer units on hand than are held in carts."""
+
+    def __init__(self, stock_ids: list[int]):
+        self.stock_ids = stock_ids
+        super().__init__(f"stock_ids={stock_ids}")
+
+
+# -----------------------------
+# Holds
+# -----------------------------
+# Held units are moved out of stock.quantity, so stock.quantity is always
+# "available" (on hand minus active holds) and on hand is stock.quantity plus
+# the SKU's hold rows. Keeping the sum materialized is what lets checkout
+# turn holds into an order without touching the stock row, and the catalog
+# read it without a join. The cost is one single-row update per add-to-cart:
+# checking availability against SUM(holds) would need the same per-SKU lock,
+# since two carts must not both claim the last unit.
+async def set_hold(user_id: int, stock_id: int, quantity: int) -> dict | None:
+    """
+    Set the user's hold on one SKU to `quantity` units and restart its TTL.
+    Only the difference to the current hold moves between stock and the hold;
+    quantity 0 releases the hold. An expired hold the sweeper has not reached
+    yet still owns its units, so it is simply revived.
+
+    The row is claimed before it is locked: two concurrent first holds would
+    otherwise both read "no hold" and both take units from stock.
+    """
+    async with transaction():
+        if quantity:
+            try:
+                await query_exec(q.CLAIM_HOLD, user_id=user_id, stock_id=stock_id)
+            except asyncpg.ForeignKeyViolationError as e:
+                if e.constraint_name == "stock_holds_stock_id_fkey":
+                    raise HoldUnavailable(stock_id, found=False) from None
+                if e.constraint_name == "stock_holds_user_id_fkey":
+                    raise UnknownUser(user_id) from None
+                raise
+        hold = await query_one(q.GET_HOLD_FOR_UPDATE, user_id=user_id, stock_id=stock_id)
+        if hold is None:
+            return None  # releasing a hold that does not exist
+        delta = quantity - hold["quantity"]
+        if delta:
+            left = await query_one(q.ADJUST_HELD_STOCK, stock_id=stock_id, delta=delta)
+            if left is None:
+                found = await query_one(q.GET_STOCK, stock_id=stock_id) is not None
+                raise HoldUnavailable(stock_id, found)
+        if quantity == 0:
+            await query_exec(q.DELETE_HOLD, hold_id=hold["hold_id"])
+            result = None
+        else:
+            result = await query_one(
+                q.UPSERT_HOLD, user_id=user_id, stock_id=stock_id, quantity=quantity, ttl=HOLD_TTL
+            )
+
+    if delta:
+        catalog_cache.invalidate()
+    return result
+
+
+async def update_stock(stock_id: int, name: str, description: str, price: float, quantity: int):
+    """
+    Replace a stock item with `quantity` units on hand. The units held in
+    carts are subtracted so they are not counted twice once they are
+    released or expire; fewer units than are held raises HeldAboveStock.
+    """
+    async with transaction():
+        if await query_one(q.LOCK_STOCK, stock_id=stock_id) is None:
+            return None
+        held = await query_val(q.GET_HELD_UNITS, stock_id=stock_id)
+        if held > quantity:
+            raise HeldAboveStock([stock_id])
+        return await query_one(
+            q.UPDATE_STOCK,
+            stock_id=stock_id, name=name, description=description, price=price, quantity=quantity, held=held,
+        )
+
+
+async def get_holds(user_id: int, touch: bool = False) -> list[dict]:
+    if touch:
+        await query_exec(q.TOUCH_USER_HOLDS, user_id=user_id, ttl=HOLD_TTL)
+    return await query_all(q.GET_USER_HOLDS, user_id=user_id)
+
+
+async def release_holds(user_id: int) -> int:
+    rows = await query_all(q.RELEASE_USER_HOLDS, user_id=user_id)
+    if rows:
+        catalog_cache.invalidate()
+    return len(rows)
+
+
+# -----------------------------
+# Expiry
+# -----------------------------
+class HoldSweeper:
+    """
+    Background task that returns expired holds to stock every
+    HOLD_SWEEP_INTERVAL seconds, HOLD_SWEEP_BATCH holds per statement.
+    """
+
+    def __init__(self, interval: float = HOLD_SWEEP_INTERVAL, batch: int = HOLD_SWEEP_BATCH):
+        self.interval = interval
+        self.batch = batch
+        self.sweeps = 0
+        self.returned = 0
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def sweep(self) -> int:
+        """Return expired holds to stock until none are left; holds released."""
+        released = 0
+        while True:
+            rows = await query_all(q.SWEEP_EXPIRED_HOLDS, limit=self.batch)
+            count = sum(row["holds"] for row in rows)
+            released += count
+            if count < self.batch:
+                break
+        self.sweeps += 1
+        if released:
+            self.returned += released
+            catalog_cache.invalidate()
+        return released
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Hold sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {"sweeps": self.sweeps, "returned": self.returned, "ttl": HOLD_TTL}
+
+
+hold_sweeper = HoldSweeper()
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from functools import partial
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long a key keeps replaying its first response (seconds)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different body."""
+
+
+def request_fingerprint(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    In-process front for the idempotency_keys table.
+
+    Recently completed keys are answered from a bounded LRU without a database
+    round trip. Concurrent requests with the same key share one execution: the
+    first starts it as a task and later arrivals await the same task, which
+    also keeps running if the first client disconnects. Keys are scoped per user.
+    """
+
+    def __init__(self, maxsize: int = IDEMPOTENCY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.coalesced = 0
+        self.executed = 0
+        self._recent = OrderedDict()  # (user_id, key) -> (request_hash, response, expires_at)
+        self._inflight = {}           # (user_id, key) -> (request_hash, task)
+
+    async def run(self, user_id: int, key: str, request_hash: str, execute) -> tuple[dict, bool]:
+        """
+        Return (response, replayed). `execute()` is awaited at most once per
+        key at a time and must itself return (response, replayed).
+        """
+        slot = (user_id, key)
+        recent = self._recent.get(slot)
+        if recent is not None and recent[2] < time.monotonic():
+            del self._recent[slot]
+            recent = None
+        if recent is not None:
+            self._recent.move_to_end(slot)
+            self._check(recent[0], request_hash)
+            self.hits += 1
+            return recent[1], True
+
+        inflight = self._inflight.get(slot)
+        if inflight is not None:
+            self._check(inflight[0], request_hash)
+            self.coalesced += 1
+            response, _ = await asyncio.shield(inflight[1])
+            return response, True
+
+        self.executed += 1
+        task = asyncio.ensure_future(execute())
+        self._inflight[slot] = (request_hash, task)
+        task.add_done_callback(partial(self._done, slot, request_hash))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _check(stored_hash: str, request_hash: str):
+        if stored_hash != request_hash:
+            raise IdempotencyConflict()
+
+    def _done(self, slot, request_hash, task):
+        self._inflight.pop(slot, None)
+        # Failed attempts are not remembered, so a retry runs again.
+        # exception() also marks the error retrieved if nobody awaited it.
+        if task.cancelled() or task.exception() is not None:
+            return
+        response, _ = task.result()
+        self._recent[slot] = (request_hash, response, time.monotonic() + IDEMPOTENCY_TTL)
+        self._recent.move_to_end(slot)
+        while len(self._recent) > self.maxsize:
+            self._recent.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._recent),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "executed": self.executed,
+        }
+
+
+idempotency_store = IdempotencyStore()
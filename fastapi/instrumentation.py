@@ -0,0 +1,241 @@
+import asyncio
+import cProfile
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from metrics import Histogram, MetricsText
+
+# -----------------------------
+# Settings
+# -----------------------------
+# The profiler only runs when PROFILING_ENABLED=1, either for requests carrying
+# an `X-Profile: 1` header or for a random PROFILE_SAMPLE_RATE of requests.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MIN_INTERVAL = float(os.getenv("PROFILE_MIN_INTERVAL", "1.0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/profiles")
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Seconds between event-loop lag samples (0 = no sampling)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class RequestStats:
+    """Database work attributed to the request currently being served."""
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def record_query(logged_query):
+    """
+    asyncpg query logger, added to every pooled connection. asyncpg schedules
+    it with call_soon, which runs it in a copy of the caller's context, so
+    `current_request` still points at the request that issued the query.
+    """
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += logged_query.elapsed
+
+
+# -----------------------------
+# Per-route metrics
+# -----------------------------
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.db_time = Histogram()
+        self.python_time = Histogram()
+        self.queries = Histogram(buckets=QUERY_COUNT_BUCKETS)
+        self.responses = {}  # status code -> count
+
+
+_routes: dict[tuple[str, str], RouteMetrics] = {}
+_routes_lock = threading.Lock()
+
+
+def observe(method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+    key = (method, route)
+    metrics = _routes.get(key)
+    if metrics is None:
+        with _routes_lock:
+            metrics = _routes.setdefault(key, RouteMetrics())
+    metrics.latency.observe(elapsed)
+    metrics.db_time.observe(stats.db_time)
+    # Time the request spent outside the database (routing, validation,
+    # serialization, waiting on the event loop)
+    metrics.python_time.observe(max(elapsed - stats.db_time, 0.0))
+    metrics.queries.observe(stats.queries)
+    metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+
+def render_route_metrics(out: MetricsText):
+    routes = sorted(_routes.items())
+    out.header("http_requests_total", "counter", "Responses by route and status code.")
+    for (method, route), m in routes:
+        for status, count in sorted(m.responses.items()):
+            out.sample("http_requests_total", count, {"method": method, "route": route, "status": status})
+    for name, attr, help_text in (
+        ("http_request_duration_seconds", "latency", "End-to-end request latency."),
+        ("http_request_db_seconds", "db_time", "Time spent in database queries per request."),
+        ("http_request_python_seconds", "python_time", "Request time spent outside the database."),
+        ("http_request_queries", "queries", "Database queries issued per request."),
+    ):
+        out.header(name, "histogram", help_text)
+        for (method, route), m in routes:
+            out.histogram(name, getattr(m, attr), {"method": method, "route": route})
+
+
+# -----------------------------
+# Event-loop lag
+# -----------------------------
+class LoopLagMonitor:
+    """
+    Background task that sleeps LOOP_LAG_INTERVAL seconds at a time and
+    records how late each wake-up is: how long a ready task waited for the
+    loop. Work that blocks the loop (CPU in a handler, a synchronous call)
+    shows up here as lag for every request in flight. Timing a bare
+    `asyncio.sleep(0)` would miss it, since that only resumes after the
+    blocking callback has returned.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = Histogram(buckets=LOOP_LAG_BUCKETS)
+        self.max_lag = 0.0
+        self._task = None
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - due, 0.0)
+            self.lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> dict:
+        return {"interval": self.interval, "max_seconds": self.max_lag, "lag_seconds": self.lag.snapshot()}
+
+
+loop_lag = LoopLagMonitor()
+
+
+# -----------------------------
+# Sampling profiler
+# -----------------------------
+_profile_lock = threading.Lock()
+_last_profile = 0.0
+
+
+def _start_profile(scope) -> cProfile.Profile | None:
+    """
+    Start cProfile for this request if it is requested or sampled. Only one
+    request is profiled at a time and at most one per PROFILE_MIN_INTERVAL,
+    which bounds the overhead. The profile covers everything the event loop
+    runs while it is active, including other requests' work.
+    """
+    global _last_profile
+    if not PROFILING_ENABLED:
+        return None
+    wanted = (b"x-profile", b"1") in scope.get("headers", [])
+    if not wanted and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+        return None
+    now = time.monotonic()
+    if now - _last_profile < PROFILE_MIN_INTERVAL or not _profile_lock.acquire(blocking=False):
+        return None
+    _last_profile = now
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _finish_profile(profiler: cProfile.Profile, path: str):
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(path)
+    finally:
+        _profile_lock.release()
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+class InstrumentationMiddleware:
+    """Pure ASGI middleware recording latency, DB time and query count per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        profiler = _start_profile(scope)
+        profile_path = None
+        if profiler is not None:
+            name = scope["path"].strip("/").replace("/", "_") or "root"
+            profile_path = os.path.join(PROFILE_DIR, f"{time.time():.3f}-{name}.prof")
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_path:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-file", profile_path.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                _finish_profile(profiler, profile_path)
+            current_request.reset(token)
+            observe(scope["method"], route_template(scope), status, elapsed, stats)
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the matched route (e.g. "/order/{order_id}"), which keeps
+    label cardinality bounded. Newer FastAPI resolves included routers lazily
+    and records the prefixed path in its own scope entry.
+    """
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    if context is not None:
+        return context.path
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
@@ -0,0 +1,70 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative latency histogram (seconds) with fixed bucket bounds."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.total, self.count
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+# -----------------------------
+# Prometheus text exposition
+# -----------------------------
+def _format_labels(labels: dict | None, extra: dict | None = None) -> str:
+    merged = {**(labels or {}), **(extra or {})}
+    if not merged:
+        return ""
+    parts = []
+    for key, value in merged.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsText:
+    """Accumulates metrics in the Prometheus text format (version 0.0.4)."""
+
+    def __init__(self):
+        self.lines = []
+
+    def header(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value, labels: dict | None = None):
+        self.lines.append(f"{name}{_format_labels(labels)} {float(value)!r}")
+
+    def histogram(self, name: str, histogram: Histogram, labels: dict | None = None):
+        snap = histogram.snapshot()
+        for bound, count in snap["buckets"].items():
+            self.lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {count}")
+        self.lines.append(f"{name}_sum{_format_labels(labels)} {snap['sum']!r}")
+        self.lines.append(f"{name}_count{_format_labels(labels)} {snap['count']}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
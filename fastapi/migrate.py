@@ -0,0 +1,138 @@
+"""
+Versioned schema migrations.
+
+Applies migrations/NNNN_name.sql in order, each file in its own transaction,
+and records it in schema_migrations. A session-level advisory lock makes
+concurrent runners (every worker runs this at startup) wait for each other,
+so each file is applied exactly once.
+
+    python migrate.py                  # apply pending migrations
+    python migrate.py --status         # list applied / pending
+    python migrate.py --mark-applied   # record without running (schema built by hand)
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from pathlib import Path
+
+import asyncpg
+import config
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version     text PRIMARY KEY,
+    name        text NOT NULL,
+    checksum    text NOT NULL,
+    duration_ms integer NOT NULL DEFAULT 0,
+    applied_at  timestamptz NOT NULL DEFAULT now()
+)
+"""
+LOCK = "SELECT pg_advisory_lock(hashtext('schema_migrations'))"
+UNLOCK = "SELECT pg_advisory_unlock(hashtext('schema_migrations'))"
+
+
+class Migration:
+    def __init__(self, path: Path):
+        self.path = path
+        self.version, _, self.name = path.stem.partition("_")
+        self.sql = path.read_text()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+
+    def __repr__(self):
+        return f"Migration({self.path.name!r})"
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> list[Migration]:
+    migrations = [Migration(path) for path in sorted(directory.glob("*.sql"))]
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"duplicate migration versions in {directory}")
+    return migrations
+
+
+def dsn() -> str:
+    """asyncpg DSN for config.DATABASE_URL (which carries the SQLAlchemy-style driver)."""
+    return config.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def applied_migrations(conn: asyncpg.Connection) -> dict[str, str]:
+    await conn.execute(CREATE_MIGRATIONS_TABLE)
+    rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    return {row["version"]: row["checksum"] for row in rows}
+
+
+async def migrate(conn: asyncpg.Connection, mark_only: bool = False) -> list[str]:
+    """Apply (or with mark_only, just record) pending migrations; their file names."""
+    await conn.execute(LOCK)
+    try:
+        applied = await applied_migrations(conn)
+        done = []
+        for migration in load_migrations():
+            checksum = applied.get(migration.version)
+            if checksum is not None:
+                if checksum != migration.checksum:
+                    logger.warning("Migration %s changed after it was applied", migration.path.name)
+                continue
+            start = time.perf_counter()
+            async with conn.transaction():
+                if not mark_only:
+                    await conn.execute(migration.sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES ($1, $2, $3, $4)",
+                    migration.version, migration.name, migration.checksum,
+                    int((time.perf_counter() - start) * 1000),
+                )
+            logger.info("Applied migration %s in %.2fs", migration.path.name, time.perf_counter() - start)
+            done.append(migration.path.name)
+        return done
+    finally:
+        await conn.execute(UNLOCK)
+
+
+async def migrate_database(database_dsn: str | None = None, mark_only: bool = False) -> list[str]:
+    """Run migrate() on a dedicated connection without the pool's statement timeout."""
+    conn = await asyncpg.connect(database_dsn or dsn(), server_settings={"statement_timeout": "0"})
+    try:
+        return await migrate(conn, mark_only)
+    finally:
+        await conn.close()
+
+
+async def status(database_dsn: str | None = None):
+    conn = await asyncpg.connect(database_dsn or dsn())
+    try:
+        applied = await applied_migrations(conn)
+    finally:
+        await conn.close()
+    for migration in load_migrations():
+        state = "applied" if migration.version in applied else "pending"
+        if applied.get(migration.version, migration.checksum) != migration.checksum:
+            state = "changed"
+        print(f"{state:<9}{migration.path.name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the SQL migrations in migrations/")
+    parser.add_argument("--dsn", help="postgresql:// DSN (default: from DATABASE_URL / POSTGRES_*)")
+    parser.add_argument("--status", action="store_true", help="list migrations and exit")
+    parser.add_argument("--mark-applied", action="store_true",
+                        help="record pending migrations as applied without running them")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.status:
+        asyncio.run(status(args.dsn))
+        return
+    done = asyncio.run(migrate_database(args.dsn, args.mark_applied))
+    print(f"{len(done)} migration(s) {'recorded' if args.mark_applied else 'applied'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+-- Baseline schema: the tables database.py and the routers were written
+-- against. Everything is IF NOT EXISTS so it is a no-op on existing
+-- databases; later migrations evolve it from here.
+CREATE TABLE IF NOT EXISTS users (
+    user_id       serial PRIMARY KEY,
+    username      varchar(100),
+    email         varchar(255) NOT NULL,
+    password_hash text NOT NULL,
+    name          varchar(100),
+    surname       varchar(100),
+    created_at    timestamp NOT NULL DEFAULT now()
+);
+
+-- Login looks users up by email. A separate index rather than an inline
+-- UNIQUE, which CREATE TABLE IF NOT EXISTS skips on a pre-existing table.
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_idx ON users (email);
+
+CREATE TABLE IF NOT EXISTS address (
+    id          serial PRIMARY KEY,
+    user_id     integer NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    street      text NOT NULL,
+    city        varchar(100) NOT NULL,
+    postal_code varchar(20) NOT NULL,
+    country     varchar(100) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS stock (
+    stock_id    serial PRIMARY KEY,
+    name        varchar(255) NOT NULL,
+    description text NOT NULL DEFAULT '',
+    price       numeric(10, 2) NOT NULL,
+    quantity    integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id    serial PRIMARY KEY,
+    user_id     integer NOT NULL REFERENCES users (user_id),
+    address_id  integer NOT NULL REFERENCES address (id),
+    total_price numeric(12, 2) NOT NULL,
+    items       text NOT NULL,
+    created_at  timestamp NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS feedback (
+    feedback_id serial PRIMARY KEY,
+    user_id     integer REFERENCES users (user_id) ON DELETE SET NULL,
+    rating      integer NOT NULL CHECK (rating BETWEEN 1 AND 5),
+    comment     text,
+    created_at  timestamp NOT NULL DEFAULT now()
+);
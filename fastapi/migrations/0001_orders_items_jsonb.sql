@@ -0,0 +1,10 @@
+-- Store order line items as native JSONB instead of JSON text.
+-- Existing rows are converted in place by the USING clause; the asyncpg
+-- codec registered in database.py then decodes them while rows are read.
+ALTER TABLE orders
+    ALTER COLUMN items TYPE jsonb USING items::jsonb;
+
+-- Lets per-SKU sales queries use containment, e.g.
+--   SELECT ... FROM orders WHERE items @> '[{"stock_id": 3}]'
+CREATE INDEX IF NOT EXISTS orders_items_gin
+    ON orders USING gin (items jsonb_path_ops);
@@ -0,0 +1,6 @@
+-- Composite index for paged order history (GET /order/user/{user_id}).
+-- Matches the (created_at, order_id) keyset ordering, and INCLUDE makes the
+-- summary projection an index-only scan.
+CREATE INDEX IF NOT EXISTS orders_user_created_idx
+    ON orders (user_id, created_at DESC, order_id DESC)
+    INCLUDE (address_id, total_price);
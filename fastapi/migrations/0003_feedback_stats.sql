@@ -0,0 +1,95 @@
+-- Incrementally maintained feedback aggregate (count, rating sum and a 1-5
+-- histogram) so GET /feedback/summary reads one row instead of scanning.
+CREATE TABLE IF NOT EXISTS feedback_stats (
+    id         boolean PRIMARY KEY DEFAULT true CHECK (id),
+    total      bigint NOT NULL DEFAULT 0,
+    rating_sum bigint NOT NULL DEFAULT 0,
+    rating_1   bigint NOT NULL DEFAULT 0,
+    rating_2   bigint NOT NULL DEFAULT 0,
+    rating_3   bigint NOT NULL DEFAULT 0,
+    rating_4   bigint NOT NULL DEFAULT 0,
+    rating_5   bigint NOT NULL DEFAULT 0
+);
+
+-- Statement-level triggers see every affected row through transition tables,
+-- so a batched insert of N rows updates the aggregate row once, not N times.
+CREATE OR REPLACE FUNCTION feedback_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE feedback_stats s SET
+            total      = s.total + d.n,
+            rating_sum = s.rating_sum + d.rating_sum,
+            rating_1   = s.rating_1 + d.r1,
+            rating_2   = s.rating_2 + d.r2,
+            rating_3   = s.rating_3 + d.r3,
+            rating_4   = s.rating_4 + d.r4,
+            rating_5   = s.rating_5 + d.r5
+        FROM (
+            SELECT count(*) AS n, coalesce(sum(rating), 0) AS rating_sum,
+                   count(*) FILTER (WHERE rating = 1) AS r1,
+                   count(*) FILTER (WHERE rating = 2) AS r2,
+                   count(*) FILTER (WHERE rating = 3) AS r3,
+                   count(*) FILTER (WHERE rating = 4) AS r4,
+                   count(*) FILTER (WHERE rating = 5) AS r5
+            FROM new_rows
+        ) d
+        WHERE s.id;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE feedback_stats s SET
+            total      = s.total - d.n,
+            rating_sum = s.rating_sum - d.rating_sum,
+            rating_1   = s.rating_1 - d.r1,
+            rating_2   = s.rating_2 - d.r2,
+            rating_3   = s.rating_3 - d.r3,
+            rating_4   = s.rating_4 - d.r4,
+            rating_5   = s.rating_5 - d.r5
+        FROM (
+            SELECT count(*) AS n, coalesce(sum(rating), 0) AS rating_sum,
+                   count(*) FILTER (WHERE rating = 1) AS r1,
+                   count(*) FILTER (WHERE rating = 2) AS r2,
+                   count(*) FILTER (WHERE rating = 3) AS r3,
+                   count(*) FILTER (WHERE rating = 4) AS r4,
+                   count(*) FILTER (WHERE rating = 5) AS r5
+            FROM old_rows
+        ) d
+        WHERE s.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Block writers while the triggers are installed and the row is backfilled,
+-- so no feedback is counted twice or missed
+LOCK TABLE feedback IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS feedback_stats_insert ON feedback;
+DROP TRIGGER IF EXISTS feedback_stats_update ON feedback;
+DROP TRIGGER IF EXISTS feedback_stats_delete ON feedback;
+
+CREATE TRIGGER feedback_stats_insert AFTER INSERT ON feedback
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+CREATE TRIGGER feedback_stats_update AFTER UPDATE ON feedback
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+CREATE TRIGGER feedback_stats_delete AFTER DELETE ON feedback
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION feedback_stats_apply();
+
+INSERT INTO feedback_stats (id, total, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+SELECT true, count(*), coalesce(sum(rating), 0),
+       count(*) FILTER (WHERE rating = 1),
+       count(*) FILTER (WHERE rating = 2),
+       count(*) FILTER (WHERE rating = 3),
+       count(*) FILTER (WHERE rating = 4),
+       count(*) FILTER (WHERE rating = 5)
+FROM feedback
+ON CONFLICT (id) DO UPDATE SET
+    total = EXCLUDED.total, rating_sum = EXCLUDED.rating_sum,
+    rating_1 = EXCLUDED.rating_1, rating_2 = EXCLUDED.rating_2, rating_3 = EXCLUDED.rating_3,
+    rating_4 = EXCLUDED.rating_4, rating_5 = EXCLUDED.rating_5;
+
+-- Keyset index for the paginated feed (GET /feedback/feed)
+CREATE INDEX IF NOT EXISTS feedback_created_idx
+    ON feedback (created_at DESC, feedback_id DESC);
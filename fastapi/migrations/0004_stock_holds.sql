@@ -0,0 +1,16 @@
+-- Time-limited stock holds for carts. Placing a hold moves units out of
+-- stock.quantity into a hold row, so stock.quantity is always what is still
+-- free to sell (on hand minus active holds) and the catalog needs no join.
+-- Checkout consumes the user's hold rows without touching stock; expired
+-- holds are returned to stock.quantity by the sweeper in holds.py.
+CREATE TABLE IF NOT EXISTS stock_holds (
+    hold_id    serial PRIMARY KEY,
+    user_id    integer NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    stock_id   integer NOT NULL REFERENCES stock (stock_id) ON DELETE CASCADE,
+    quantity   integer NOT NULL CHECK (quantity > 0),
+    expires_at timestamptz NOT NULL,
+    UNIQUE (user_id, stock_id)
+);
+
+-- The sweeper walks holds oldest-expiry first
+CREATE INDEX IF NOT EXISTS stock_holds_expires_idx ON stock_holds (expires_at);
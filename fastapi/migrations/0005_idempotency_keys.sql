@@ -0,0 +1,12 @@
+-- Idempotency-Key records for POST /order/. A key is claimed inside the order
+-- transaction, so a duplicate sent to another worker blocks on the primary
+-- key until the first attempt commits (then replays `response`) or rolls back
+-- (then runs itself). Keys older than IDEMPOTENCY_TTL may be claimed again.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id      integer NOT NULL,
+    key          text NOT NULL,
+    request_hash text NOT NULL,
+    response     jsonb,
+    created_at   timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, key)
+);
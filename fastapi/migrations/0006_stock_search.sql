@@ -0,0 +1,10 @@
+-- Full-text search over the catalog. A generated column keeps the document
+-- in step with every write path (INSERT/UPDATE, the bulk import upsert) with
+-- no trigger or application code. Name matches rank above description ones.
+ALTER TABLE stock ADD COLUMN IF NOT EXISTS search tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS stock_search_idx ON stock USING gin (search);
@@ -0,0 +1,12 @@
+-- Default address per user. The partial unique index allows at most one
+-- default and is the conflict target of the single-statement default-address
+-- upsert; the plain user_id index serves the address book listing.
+ALTER TABLE address ADD COLUMN IF NOT EXISTS is_default boolean NOT NULL DEFAULT false;
+
+-- Until now the first address was the one used at checkout
+UPDATE address a SET is_default = true
+WHERE a.id = (SELECT min(id) FROM address b WHERE b.user_id = a.user_id)
+  AND NOT EXISTS (SELECT 1 FROM address c WHERE c.user_id = a.user_id AND c.is_default);
+
+CREATE UNIQUE INDEX IF NOT EXISTS address_user_default_idx ON address (user_id) WHERE is_default;
+CREATE INDEX IF NOT EXISTS address_user_id_idx ON address (user_id);
@@ -0,0 +1,36 @@
+-- Sales rollups for the analytics endpoints. analytics.py folds new orders
+-- into these tables in batches, walking orders by (created_at, order_id)
+-- past the watermark below, so dashboards never scan or unpack `orders`.
+CREATE TABLE IF NOT EXISTS sales_daily (
+    day     date PRIMARY KEY,
+    orders  bigint NOT NULL DEFAULT 0,
+    units   bigint NOT NULL DEFAULT 0,
+    revenue numeric(14, 2) NOT NULL DEFAULT 0
+);
+
+-- One row per SKU per day; "units per stock_id" over any range sums these
+CREATE TABLE IF NOT EXISTS sales_by_stock (
+    day      date NOT NULL,
+    stock_id integer NOT NULL,
+    orders   bigint NOT NULL DEFAULT 0,
+    units    bigint NOT NULL DEFAULT 0,
+    revenue  numeric(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, stock_id)
+);
+
+CREATE INDEX IF NOT EXISTS sales_by_stock_stock_idx ON sales_by_stock (stock_id, day);
+
+-- Last order folded into the rollups, as a keyset position
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name       text PRIMARY KEY,
+    created_at timestamp NOT NULL,
+    order_id   integer NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+INSERT INTO rollup_watermarks (name, created_at, order_id)
+VALUES ('sales', '-infinity', 0)
+ON CONFLICT (name) DO NOTHING;
+
+-- The refresher reads orders in watermark order
+CREATE INDEX IF NOT EXISTS orders_created_idx ON orders (created_at, order_id);
@@ -0,0 +1,6 @@
+-- set_hold() first claims the (user, stock) row with a zero-quantity insert
+-- and then locks it, so concurrent first holds on the same item serialize on
+-- that row instead of both reading "no hold". The zero row only exists
+-- inside that transaction: it is raised to the held quantity or deleted.
+ALTER TABLE stock_holds DROP CONSTRAINT IF EXISTS stock_holds_quantity_check;
+ALTER TABLE stock_holds ADD CONSTRAINT stock_holds_quantity_check CHECK (quantity >= 0);
@@ -0,0 +1,20 @@
+from datetime import datetime
+from fastapi import HTTPException
+
+# Keyset cursors for lists ordered by (created_at, id). A cursor is the
+# "<created_at ISO>,<id>" of a row on the edge of a page.
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f"{created_at.isoformat()},{row_id}"
+
+
+def decode_cursor(cursor: str | None) -> tuple | None:
+    """Parse a cursor into (created_at, id); 400 if it is malformed."""
+    if cursor is None:
+        return None
+    try:
+        created_at, row_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
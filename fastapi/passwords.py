@@ -0,0 +1,155 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from metrics import Histogram
+
+# -----------------------------
+# Settings
+# -----------------------------
+PASSWORD_KDF = os.getenv("PASSWORD_KDF", "scrypt")  # scrypt | pbkdf2_sha256
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", "600000"))
+
+# Max KDF computations running at once; extra requests wait their turn
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# "thread" is enough because hashlib releases the GIL inside the KDF;
+# "process" isolates the work completely at the cost of pickling overhead
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+SALT_BYTES = 16
+
+hash_latency = Histogram()
+verify_latency = Histogram()
+queue_wait = Histogram()
+
+_executor = None
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _unb64(data: str) -> bytes:
+    return base64.b64decode(data.encode())
+
+
+# -----------------------------
+# KDFs (run inside the worker pool)
+# -----------------------------
+# Stored hashes describe themselves so the cost can be raised later:
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+# A bare 64-char hex string is the legacy unsalted SHA-256 hash.
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r + (1 << 20), dklen=32,
+    )
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+def _hash(password: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    if PASSWORD_KDF == "pbkdf2_sha256":
+        digest = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def _verify(password: str, stored: str) -> bool:
+    parts = stored.split("$")
+    if parts[0] == "scrypt" and len(parts) == 6:
+        n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        digest = _scrypt(password, _unb64(parts[4]), n, r, p)
+        return hmac.compare_digest(digest, _unb64(parts[5]))
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        digest = _pbkdf2(password, _unb64(parts[2]), int(parts[1]))
+        return hmac.compare_digest(digest, _unb64(parts[3]))
+    if len(parts) == 1:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+    return False
+
+
+def needs_rehash(stored: str) -> bool:
+    """True if `stored` was not produced with the current KDF and cost."""
+    parts = stored.split("$")
+    if PASSWORD_KDF == "pbkdf2_sha256":
+        return parts[0] != "pbkdf2_sha256" or int(parts[1]) < PBKDF2_ITERATIONS
+    if parts[0] != "scrypt":
+        return True
+    return (int(parts[1]), int(parts[2]), int(parts[3])) < (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+# -----------------------------
+# Async API
+# -----------------------------
+def get_executor():
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-kdf"
+            )
+    return _executor
+
+
+async def _run(histogram: Histogram, fn, *args):
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        return started, fn(*args)
+
+    # The timing wrapper only works in-thread; processes report end-to-end time
+    if PASSWORD_HASH_EXECUTOR == "process":
+        result = await loop.run_in_executor(get_executor(), fn, *args)
+        histogram.observe(time.perf_counter() - submitted)
+        return result
+
+    started, result = await loop.run_in_executor(get_executor(), timed)
+    queue_wait.observe(started - submitted)
+    histogram.observe(time.perf_counter() - started)
+    return result
+
+
+async def hash_password(password: str) -> str:
+    """Hash `password` with the configured KDF off the event loop."""
+    return await _run(hash_latency, _hash, password)
+
+
+async def verify_password(password: str, stored: str) -> bool:
+    """Check `password` against any supported stored hash off the event loop."""
+    return await _run(verify_latency, _verify, password, stored)
+
+
+def stats() -> dict:
+    return {
+        "kdf": PASSWORD_KDF,
+        "workers": PASSWORD_HASH_WORKERS,
+        "executor": PASSWORD_HASH_EXECUTOR,
+        "hash_seconds": hash_latency.snapshot(),
+        "verify_seconds": verify_latency.snapshot(),
+        "queue_wait_seconds": queue_wait.snapshot(),
+    }
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,756 @@
+import re
+
+# :name placeholders, skipping Postgres `::type` casts
+_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+class Query:
+    """
+    A statement declared once and compiled at import time from `:named`
+    placeholders to asyncpg's positional `$n` form.
+
+    asyncpg keeps a per-connection prepared-statement cache keyed on the SQL
+    text, so every Query is parsed and planned once per pooled connection and
+    afterwards only bound and executed.
+    """
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.source = sql
+        self.params = []
+
+        def placeholder(match):
+            param = match.group(1)
+            if param not in self.params:
+                self.params.append(param)
+            return f"${self.params.index(param) + 1}"
+
+        self.sql = _PARAM.sub(placeholder, sql)
+
+    def args(self, values: dict) -> list:
+        try:
+            return [values[param] for param in self.params]
+        except KeyError as e:
+            raise TypeError(f"query {self.name!r} missing value for {e.args[0]!r}") from None
+
+    def __repr__(self):
+        return f"Query({self.name!r})"
+
+
+REGISTRY: dict[str, Query] = {}
+
+
+def register(name: str, sql: str) -> Query:
+    if name in REGISTRY:
+        raise ValueError(f"query {name!r} registered twice")
+    REGISTRY[name] = Query(name, sql)
+    return REGISTRY[name]
+
+
+# -----------------------------
+# Users
+# -----------------------------
+INSERT_USER = register("insert_user", """
+INSERT INTO users (username, password_hash, email)
+VALUES (:username, :password_hash, :email)
+RETURNING user_id, username, password_hash, email, created_at
+""")
+
+REGISTER_USER = register("register_user", """
+INSERT INTO users (email, password_hash, name, surname, created_at)
+VALUES (:email, :password_hash, :name, :surname, :created_at)
+RETURNING user_id, email, name, surname, created_at
+""")
+
+GET_USER = register("get_user", "SELECT * FROM users WHERE user_id = :user_id")
+
+GET_USER_BY_EMAIL = register("get_user_by_email", """
+SELECT user_id, email, password_hash, name, surname, created_at
+FROM users WHERE email = :email
+""")
+
+UPDATE_USER = register("update_user", """
+UPDATE users
+SET username = :username, password_hash = :password_hash, email = :email
+WHERE user_id = :user_id
+RETURNING user_id, username, password_hash, email, created_at
+""")
+
+UPDATE_USER_NAME = register("update_user_name", """
+UPDATE users
+SET name = :name, surname = :surname
+WHERE user_id = :user_id
+RETURNING user_id, email, name, surname, created_at
+""")
+
+UPDATE_PASSWORD_HASH = register("update_password_hash", """
+UPDATE users SET password_hash = :password_hash WHERE user_id = :user_id
+""")
+
+DELETE_USER = register("delete_user", "DELETE FROM users WHERE user_id = :user_id RETURNING *")
+
+
+# -----------------------------
+# Address
+# -----------------------------
+_ADDRESS_COLUMNS = "id, user_id, street, city, postal_code, country, is_default"
+
+# A user's first address becomes the default
+INSERT_ADDRESS = register("insert_address", f"""
+INSERT INTO address (user_id, street, city, postal_code, country, is_default)
+VALUES (
+    :user_id, :street, :city, :postal_code, :country,
+    NOT EXISTS (SELECT 1 FROM address WHERE user_id = :user_id AND is_default)
+)
+RETURNING {_ADDRESS_COLUMNS}
+""")
+
+# Default address first
+GET_ADDRESS = register("get_address", f"""
+SELECT {_ADDRESS_COLUMNS} FROM address
+WHERE user_id = :user_id
+ORDER BY is_default DESC, id
+""")
+
+UPDATE_ADDRESS = register("update_address", f"""
+UPDATE address
+SET street = :street, city = :city, postal_code = :postal_code, country = :country
+WHERE id = :id
+RETURNING {_ADDRESS_COLUMNS}
+""")
+
+# Create or overwrite the user's default address in one statement; the
+# partial unique index address_user_default_idx is the conflict target
+UPSERT_DEFAULT_ADDRESS = register("upsert_default_address", f"""
+INSERT INTO address (user_id, street, city, postal_code, country, is_default)
+VALUES (:user_id, :street, :city, :postal_code, :country, true)
+ON CONFLICT (user_id) WHERE is_default
+DO UPDATE SET street = EXCLUDED.street, city = EXCLUDED.city,
+              postal_code = EXCLUDED.postal_code, country = EXCLUDED.country
+RETURNING {_ADDRESS_COLUMNS}
+""")
+
+# Switching the default is two statements in one transaction: the unique
+# index is checked row by row, so the old default must be cleared first
+CLEAR_DEFAULT_ADDRESS = register("clear_default_address", """
+UPDATE address SET is_default = false
+WHERE user_id = :user_id AND is_default AND id <> :id
+""")
+
+SET_DEFAULT_ADDRESS = register("set_default_address", f"""
+UPDATE address SET is_default = true
+WHERE id = :id AND user_id = :user_id
+RETURNING {_ADDRESS_COLUMNS}
+""")
+
+# User plus default address for the checkout page, one index lookup each
+GET_CHECKOUT_CONTEXT = register("get_checkout_context", """
+SELECT u.user_id, u.email, u.name, u.surname, u.created_at,
+       CASE WHEN a.id IS NULL THEN NULL ELSE json_build_object(
+           'id', a.id, 'user_id', a.user_id, 'street', a.street, 'city', a.city,
+           'postal_code', a.postal_code, 'country', a.country, 'is_default', a.is_default
+       ) END AS address
+FROM users u
+LEFT JOIN address a ON a.user_id = u.user_id AND a.is_default
+WHERE u.user_id = :user_id
+""")
+
+DELETE_ADDRESS = register("delete_address", "DELETE FROM address WHERE id = :id RETURNING *")
+
+
+# -----------------------------
+# Stock
+# -----------------------------
+INSERT_STOCK = register("insert_stock", """
+INSERT INTO stock (name, description, price, quantity)
+VALUES (:name, :description, :price, :quantity)
+RETURNING stock_id, name, description, price, quantity
+""")
+
+GET_STOCK = register("get_stock", "SELECT * FROM stock WHERE stock_id = :stock_id")
+
+GET_ALL_STOCK = register("get_all_stock", """
+SELECT stock_id, name, description, price, quantity FROM stock ORDER BY stock_id
+""")
+
+# Keyset page of the listing (GET /stock/ with parameters). A NULL filter
+# is off; LIMIT NULL (the NDJSON stream) returns every row after :after.
+# :after is never NULL so the keyset stays an index range even in a
+# generic plan.
+LIST_STOCK = register("list_stock", """
+SELECT stock_id, name, description, price, quantity FROM stock
+WHERE stock_id > CAST(:after AS int)
+  AND (CAST(:min_price AS numeric) IS NULL OR price >= CAST(:min_price AS numeric))
+  AND (CAST(:max_price AS numeric) IS NULL OR price <= CAST(:max_price AS numeric))
+  AND (NOT CAST(:in_stock AS boolean) OR quantity > 0)
+ORDER BY stock_id
+LIMIT CAST(:limit AS bigint)
+""")
+
+# FAST_JSON catalog: Postgres builds the JSON array and it is passed through
+# as text (cast so the json codec does not decode it)
+GET_ALL_STOCK_JSON = register("get_all_stock_json", """
+SELECT CAST(coalesce(json_agg(json_build_object(
+    'stock_id', stock_id, 'name', name, 'description', description,
+    'price', price, 'quantity', quantity
+) ORDER BY stock_id), '[]') AS text)
+FROM stock
+""")
+
+# Writes give the units on hand; stock.quantity stores what is free to sell,
+# so units held in carts (:held, read under LOCK_STOCK) are subtracted
+# stock.quantity is what is free to sell (see holds.py): store on hand minus
+# the held units, and answer with the on-hand number the caller wrote
+UPDATE_STOCK = register("update_stock", """
+UPDATE stock
+SET name = :name, description = :description, price = :price, quantity = :quantity - :held
+WHERE stock_id = :stock_id
+RETURNING stock_id, name, description, price, quantity + :held AS quantity
+""")
+
+LOCK_STOCK = register("lock_stock", "SELECT stock_id FROM stock WHERE stock_id = :stock_id FOR UPDATE")
+
+GET_HELD_UNITS = register("get_held_units", """
+SELECT CAST(COALESCE(SUM(quantity), 0) AS int) FROM stock_holds WHERE stock_id = :stock_id
+""")
+
+DELETE_STOCK = register("delete_stock", "DELETE FROM stock WHERE stock_id = :stock_id RETURNING *")
+
+# Validate and decrement every line item in one statement. Duplicate stock_ids
+# are summed first so a cart listing the same drone twice is checked as one
+# line. The `quantity >= qty` guard is re-checked by Postgres against the
+# locked row, so concurrent checkouts can never drive a quantity negative.
+# Rows are locked up front in stock_id order: the UPDATE alone locks them in
+# join order, and two carts sharing SKUs could then deadlock.
+RESERVE_STOCK = register("reserve_stock", """
+WITH req AS (
+    SELECT stock_id, SUM(qty) AS qty
+    FROM unnest(CAST(:stock_ids AS int[]), CAST(:quantities AS int[])) AS r(stock_id, qty)
+    GROUP BY stock_id
+), locked AS MATERIALIZED (
+    SELECT stock_id FROM stock
+    WHERE stock_id = ANY(CAST(:stock_ids AS int[]))
+    ORDER BY stock_id
+    FOR UPDATE
+), upd AS (
+    UPDATE stock s
+    SET quantity = s.quantity - req.qty
+    FROM locked l
+    JOIN req ON req.stock_id = l.stock_id
+    WHERE s.stock_id = l.stock_id AND s.quantity >= req.qty
+    RETURNING s.stock_id
+)
+SELECT
+    req.stock_id,
+    s.stock_id IS NOT NULL AS found,
+    upd.stock_id IS NOT NULL AS reserved
+FROM req
+LEFT JOIN stock s ON s.stock_id = req.stock_id
+LEFT JOIN upd ON upd.stock_id = req.stock_id
+ORDER BY req.stock_id
+""")
+
+# Bulk import (stock_io.py): rows are COPYed into the session's stock_import
+# staging table, then applied with one upsert. Rows with a stock_id update
+# that SKU (or create it with that id), rows without one are new SKUs. If an
+# id appears twice the later line wins.
+CREATE_STOCK_IMPORT = register("create_stock_import", """
+CREATE TEMP TABLE stock_import (
+    line        integer NOT NULL,
+    stock_id    integer,
+    name        varchar(255) NOT NULL,
+    description text NOT NULL,
+    price       numeric(10, 2) NOT NULL,
+    quantity    integer NOT NULL
+) ON COMMIT DROP
+""")
+
+# Lock the existing rows an import replaces, so holds placed meanwhile are
+# counted by APPLY_STOCK_IMPORT (a later statement, with a fresh snapshot)
+LOCK_IMPORTED_STOCK = register("lock_imported_stock", """
+SELECT s.stock_id FROM stock s
+WHERE s.stock_id IN (SELECT stock_id FROM stock_import)
+ORDER BY s.stock_id
+FOR UPDATE
+""")
+
+# Imported quantities are units on hand; units held in carts are subtracted
+# like UPDATE_STOCK does. `overheld` lists items with more units held than
+# the file gives them, and the caller rolls back.
+APPLY_STOCK_IMPORT = register("apply_stock_import", """
+WITH rows AS (
+    SELECT DISTINCT ON (COALESCE(stock_id, -line)) *
+    FROM stock_import
+    ORDER BY COALESCE(stock_id, -line), line DESC
+), held AS (
+    SELECT stock_id, SUM(quantity) AS units FROM stock_holds
+    WHERE stock_id IN (SELECT stock_id FROM rows)
+    GROUP BY stock_id
+), upserted AS (
+    INSERT INTO stock (stock_id, name, description, price, quantity)
+    SELECT COALESCE(r.stock_id, nextval(pg_get_serial_sequence('stock', 'stock_id'))),
+           r.name, r.description, r.price, r.quantity - COALESCE(h.units, 0)
+    FROM rows r
+    LEFT JOIN held h ON h.stock_id = r.stock_id
+    ON CONFLICT (stock_id) DO UPDATE
+    SET name = EXCLUDED.name, description = EXCLUDED.description,
+        price = EXCLUDED.price, quantity = EXCLUDED.quantity
+    RETURNING stock_id, quantity, xmax = 0 AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted) AS inserted,
+       count(*) FILTER (WHERE NOT inserted) AS updated,
+       array_agg(stock_id ORDER BY stock_id) FILTER (WHERE quantity < 0) AS overheld
+FROM upserted
+""")
+
+# Move the serial sequence past every explicit id (existing or imported)
+# before the upsert, so ids drawn for new rows never collide with them
+SYNC_STOCK_SEQUENCE = register("sync_stock_sequence", """
+SELECT setval(
+    pg_get_serial_sequence('stock', 'stock_id'),
+    GREATEST(
+        (SELECT MAX(stock_id) FROM stock),
+        (SELECT MAX(stock_id) FROM stock_import),
+        pg_sequence_last_value(CAST(pg_get_serial_sequence('stock', 'stock_id') AS regclass)),
+        1
+    )
+)
+""")
+
+EXPORT_STOCK_CSV = """
+SELECT stock_id, name, description, price, quantity FROM stock ORDER BY stock_id
+"""
+
+EXPORT_STOCK_NDJSON = """
+SELECT json_build_object(
+    'stock_id', stock_id, 'name', name, 'description', description,
+    'price', price, 'quantity', quantity
+) FROM stock ORDER BY stock_id
+"""
+
+# Catalog search (search.py). :tsquery is built from the user's words with
+# the last one as a prefix, e.g. "camera dro" -> "camera & dro:*". Price
+# facets count the full match set before the price filter is applied, so
+# every bucket shows how many results choosing it would give.
+SEARCH_STOCK = register("search_stock", """
+WITH matched AS (
+    SELECT stock_id, name, description, price, quantity,
+           ts_rank_cd(search, query) AS rank
+    FROM stock, to_tsquery('english', :tsquery) AS query
+    WHERE search @@ query
+      AND (NOT :in_stock OR quantity > 0)
+), filtered AS (
+    SELECT * FROM matched
+    WHERE (CAST(:min_price AS numeric) IS NULL OR price >= :min_price)
+      AND (CAST(:max_price AS numeric) IS NULL OR price <= :max_price)
+)
+SELECT
+    (SELECT count(*) FROM filtered) AS total,
+    (SELECT coalesce(json_agg(top ORDER BY top.rank DESC, top.stock_id), '[]')
+     FROM (SELECT * FROM filtered ORDER BY rank DESC, stock_id LIMIT :limit) top) AS items,
+    (SELECT coalesce(json_agg(b ORDER BY b.bucket), '[]')
+     FROM (
+        SELECT width_bucket(price, CAST(:bounds AS numeric[])) AS bucket, count(*) AS count
+        FROM matched GROUP BY 1
+     ) b) AS price_facets
+""")
+
+# Type-ahead fallback when the in-process index is off
+AUTOCOMPLETE_STOCK = register("autocomplete_stock", """
+SELECT stock_id, name
+FROM stock, to_tsquery('english', :tsquery) AS query
+WHERE search @@ query
+ORDER BY ts_rank_cd(search, query) DESC, stock_id
+LIMIT :limit
+""")
+
+GET_STOCK_NAMES = register("get_stock_names", "SELECT stock_id, name FROM stock")
+
+
+# -----------------------------
+# Stock holds
+# -----------------------------
+# Make sure the hold row exists before locking it; a new one starts at zero
+# units and is raised or deleted by the same transaction
+CLAIM_HOLD = register("claim_hold", """
+INSERT INTO stock_holds (user_id, stock_id, quantity, expires_at)
+VALUES (:user_id, :stock_id, 0, now())
+ON CONFLICT (user_id, stock_id) DO NOTHING
+""")
+
+GET_HOLD_FOR_UPDATE = register("get_hold_for_update", """
+SELECT hold_id, quantity FROM stock_holds
+WHERE user_id = :user_id AND stock_id = :stock_id
+FOR UPDATE
+""")
+
+# Move `delta` units between stock and a hold (negative delta returns units).
+# Taking units is guarded by the locked row's quantity, like RESERVE_STOCK.
+ADJUST_HELD_STOCK = register("adjust_held_stock", """
+UPDATE stock SET quantity = quantity - :delta
+WHERE stock_id = :stock_id AND quantity >= :delta
+RETURNING quantity
+""")
+
+UPSERT_HOLD = register("upsert_hold", """
+INSERT INTO stock_holds (user_id, stock_id, quantity, expires_at)
+VALUES (:user_id, :stock_id, :quantity, now() + make_interval(secs => :ttl))
+ON CONFLICT (user_id, stock_id)
+DO UPDATE SET quantity = EXCLUDED.quantity, expires_at = EXCLUDED.expires_at
+RETURNING hold_id, user_id, stock_id, quantity, expires_at
+""")
+
+DELETE_HOLD = register("delete_hold", "DELETE FROM stock_holds WHERE hold_id = :hold_id")
+
+GET_USER_HOLDS = register("get_user_holds", """
+SELECT h.hold_id, h.user_id, h.stock_id, s.name, s.price, h.quantity, h.expires_at
+FROM stock_holds h
+JOIN stock s ON s.stock_id = h.stock_id
+WHERE h.user_id = :user_id AND h.expires_at > now()
+ORDER BY h.stock_id
+""")
+
+# Refresh the TTL of every active hold of a user (the cart page is open)
+TOUCH_USER_HOLDS = register("touch_user_holds", """
+UPDATE stock_holds SET expires_at = now() + make_interval(secs => :ttl)
+WHERE user_id = :user_id AND expires_at > now()
+""")
+
+# Release all of a user's holds, active or expired, returning units to stock
+RELEASE_USER_HOLDS = register("release_user_holds", """
+WITH released AS (
+    DELETE FROM stock_holds WHERE user_id = :user_id
+    RETURNING stock_id, quantity
+)
+UPDATE stock s SET quantity = s.quantity + r.quantity
+FROM released r
+WHERE s.stock_id = r.stock_id
+RETURNING s.stock_id
+""")
+
+# Sweeper: return up to :limit expired holds to stock. SKIP LOCKED leaves
+# holds that a checkout or refresh is working on for the next pass.
+SWEEP_EXPIRED_HOLDS = register("sweep_expired_holds", """
+WITH expired AS (
+    DELETE FROM stock_holds
+    WHERE hold_id IN (
+        SELECT hold_id FROM stock_holds
+        WHERE expires_at <= now()
+        ORDER BY expires_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING stock_id, quantity
+), returned AS (
+    SELECT stock_id, SUM(quantity) AS quantity, COUNT(*) AS holds
+    FROM expired GROUP BY stock_id
+)
+UPDATE stock s SET quantity = s.quantity + r.quantity
+FROM returned r
+WHERE s.stock_id = r.stock_id
+RETURNING s.stock_id, r.holds
+""")
+
+# Checkout: take each line from the user's active hold on that SKU. Fully
+# used holds are deleted, larger ones shrink; only hold rows are locked.
+# `remaining` is what still has to come from stock via RESERVE_STOCK.
+CONSUME_HOLDS = register("consume_holds", """
+WITH req AS (
+    SELECT stock_id, SUM(qty) AS qty
+    FROM unnest(CAST(:stock_ids AS int[]), CAST(:quantities AS int[])) AS r(stock_id, qty)
+    GROUP BY stock_id
+), used AS (
+    DELETE FROM stock_holds h USING req
+    WHERE h.user_id = :user_id AND h.stock_id = req.stock_id
+      AND h.expires_at > now() AND h.quantity <= req.qty
+    RETURNING h.stock_id, h.quantity AS taken
+), shrunk AS (
+    UPDATE stock_holds h SET quantity = h.quantity - req.qty
+    FROM req
+    WHERE h.user_id = :user_id AND h.stock_id = req.stock_id
+      AND h.expires_at > now() AND h.quantity > req.qty
+    RETURNING h.stock_id, req.qty AS taken
+)
+SELECT req.stock_id, CAST(req.qty - COALESCE(t.taken, 0) AS int) AS remaining
+FROM req
+LEFT JOIN (SELECT * FROM used UNION ALL SELECT * FROM shrunk) t ON t.stock_id = req.stock_id
+ORDER BY req.stock_id
+""")
+
+
+# -----------------------------
+# Orders
+# -----------------------------
+INSERT_ORDER = register("insert_order", """
+INSERT INTO orders (user_id, address_id, total_price, items, created_at)
+VALUES (:user_id, :address_id, :total_price, :items, :created_at)
+RETURNING order_id, user_id, address_id, total_price, items, created_at
+""")
+
+GET_ORDER = register("get_order", "SELECT * FROM orders WHERE order_id = :order_id")
+
+# Order history is paged by keyset on (created_at, order_id), newest first,
+# so every page is a bounded range scan of orders_user_created_idx.
+GET_USER_ORDERS = register("get_user_orders", """
+SELECT * FROM orders
+WHERE user_id = :user_id
+ORDER BY created_at DESC, order_id DESC
+LIMIT :limit
+""")
+
+GET_USER_ORDERS_BEFORE = register("get_user_orders_before", """
+SELECT * FROM orders
+WHERE user_id = :user_id AND (created_at, order_id) < (:created_at, :order_id)
+ORDER BY created_at DESC, order_id DESC
+LIMIT :limit
+""")
+
+# Summary projection: served from the index alone, items are never read
+GET_USER_ORDER_SUMMARIES = register("get_user_order_summaries", """
+SELECT order_id, user_id, address_id, total_price, created_at FROM orders
+WHERE user_id = :user_id
+ORDER BY created_at DESC, order_id DESC
+LIMIT :limit
+""")
+
+GET_USER_ORDER_SUMMARIES_BEFORE = register("get_user_order_summaries_before", """
+SELECT order_id, user_id, address_id, total_price, created_at FROM orders
+WHERE user_id = :user_id AND (created_at, order_id) < (:created_at, :order_id)
+ORDER BY created_at DESC, order_id DESC
+LIMIT :limit
+""")
+
+UPDATE_ORDER = register("update_order", """
+UPDATE orders
+SET total_price = :total_price, items = :items
+WHERE order_id = :order_id
+RETURNING order_id, user_id, address_id, total_price, created_at, items
+""")
+
+DELETE_ORDER = register("delete_order", "DELETE FROM orders WHERE order_id = :order_id RETURNING *")
+
+
+# -----------------------------
+# Sales analytics
+# -----------------------------
+# Only one refresher may move the watermark at a time; workers that do not
+# get the lock skip their turn
+TRY_ROLLUP_LOCK = register("try_rollup_lock", "SELECT pg_try_advisory_xact_lock(hashtext('sales_rollup'))")
+ROLLUP_LOCK = register("rollup_lock", "SELECT pg_advisory_xact_lock(hashtext('sales_rollup'))")
+
+# Fold the next :limit orders past the watermark into the rollups and advance
+# it, in one statement. Orders newer than :lag seconds are left for the next
+# run so a slow transaction that commits an older created_at is not skipped.
+# created_at is UTC (datetime.utcnow() in insert_order), and so are the days.
+REFRESH_SALES_ROLLUP = register("refresh_sales_rollup", """
+WITH mark AS (
+    SELECT created_at, order_id FROM rollup_watermarks WHERE name = 'sales'
+), batch AS (
+    SELECT o.order_id, o.created_at, o.total_price, o.items
+    FROM orders o, mark
+    WHERE (o.created_at, o.order_id) > (mark.created_at, mark.order_id)
+      AND o.created_at < (now() AT TIME ZONE 'UTC') - make_interval(secs => :lag)
+    ORDER BY o.created_at, o.order_id
+    LIMIT :limit
+), lines AS (
+    SELECT b.order_id, CAST(b.created_at AS date) AS day,
+           CAST(i->>'stock_id' AS integer) AS stock_id,
+           CAST(i->>'quantity' AS integer) AS quantity,
+           CAST(i->>'price' AS numeric) AS price
+    FROM batch b, jsonb_array_elements(b.items) i
+), daily AS (
+    INSERT INTO sales_daily AS s (day, orders, units, revenue)
+    SELECT CAST(b.created_at AS date), count(*), coalesce(sum(l.units), 0), sum(b.total_price)
+    FROM batch b
+    LEFT JOIN (SELECT order_id, sum(quantity) AS units FROM lines GROUP BY order_id) l USING (order_id)
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET
+        orders = s.orders + EXCLUDED.orders,
+        units = s.units + EXCLUDED.units,
+        revenue = s.revenue + EXCLUDED.revenue
+), per_stock AS (
+    INSERT INTO sales_by_stock AS s (day, stock_id, orders, units, revenue)
+    SELECT day, stock_id, count(DISTINCT order_id), sum(quantity), sum(quantity * price)
+    FROM lines
+    GROUP BY day, stock_id
+    ON CONFLICT (day, stock_id) DO UPDATE SET
+        orders = s.orders + EXCLUDED.orders,
+        units = s.units + EXCLUDED.units,
+        revenue = s.revenue + EXCLUDED.revenue
+)
+UPDATE rollup_watermarks w
+SET created_at = last.created_at, order_id = last.order_id, updated_at = now()
+FROM (SELECT created_at, order_id FROM batch ORDER BY created_at DESC, order_id DESC LIMIT 1) last
+WHERE w.name = 'sales'
+RETURNING (SELECT count(*) FROM batch) AS orders, w.created_at
+""")
+
+RESET_SALES_ROLLUP = register("reset_sales_rollup", """
+WITH cleared_daily AS (DELETE FROM sales_daily), cleared_stock AS (DELETE FROM sales_by_stock)
+UPDATE rollup_watermarks
+SET created_at = '-infinity', order_id = 0, updated_at = now()
+WHERE name = 'sales'
+""")
+
+GET_SALES_WATERMARK = register("get_sales_watermark", """
+SELECT created_at, order_id, updated_at FROM rollup_watermarks WHERE name = 'sales'
+""")
+
+GET_REVENUE_BY_DAY = register("get_revenue_by_day", """
+SELECT day, orders, units, revenue FROM sales_daily
+WHERE day BETWEEN :start AND :end
+ORDER BY day
+""")
+
+GET_TOP_STOCK = register("get_top_stock", """
+SELECT r.stock_id, s.name, r.orders, r.units, r.revenue
+FROM (
+    SELECT stock_id, sum(orders) AS orders, sum(units) AS units, sum(revenue) AS revenue
+    FROM sales_by_stock
+    WHERE day BETWEEN :start AND :end
+    GROUP BY stock_id
+    ORDER BY sum(units) DESC, stock_id
+    LIMIT :limit
+) r
+LEFT JOIN stock s ON s.stock_id = r.stock_id
+ORDER BY r.units DESC, r.stock_id
+""")
+
+GET_STOCK_SALES = register("get_stock_sales", """
+SELECT day, orders, units, revenue FROM sales_by_stock
+WHERE stock_id = :stock_id AND day BETWEEN :start AND :end
+ORDER BY day
+""")
+
+# Low on hand, or selling fast enough to run out within :cover_days at the
+# average daily rate of the last :days days
+GET_LOW_STOCK = register("get_low_stock", """
+SELECT s.stock_id, s.name, s.quantity,
+       coalesce(v.units, 0) AS units_sold,
+       CASE WHEN v.units > 0 THEN round(s.quantity / (v.units / CAST(:days AS numeric)), 1) END AS days_left
+FROM stock s
+LEFT JOIN (
+    SELECT stock_id, sum(units) AS units FROM sales_by_stock
+    WHERE day > CAST(now() AT TIME ZONE 'UTC' AS date) - CAST(:days AS integer)
+    GROUP BY stock_id
+) v ON v.stock_id = s.stock_id
+WHERE s.quantity <= :threshold
+   OR (v.units > 0 AND s.quantity < v.units / CAST(:days AS numeric) * CAST(:cover_days AS numeric))
+ORDER BY days_left NULLS LAST, s.quantity, s.stock_id
+LIMIT :limit
+""")
+
+
+# -----------------------------
+# Idempotency keys
+# -----------------------------
+# Returns no row if the key is held by another request (after waiting for that
+# transaction to finish) or was used within the last :ttl seconds.
+CLAIM_IDEMPOTENCY_KEY = register("claim_idempotency_key", """
+INSERT INTO idempotency_keys (user_id, key, request_hash)
+VALUES (:user_id, :key, :request_hash)
+ON CONFLICT (user_id, key) DO UPDATE
+SET request_hash = EXCLUDED.request_hash, response = NULL, created_at = now()
+WHERE idempotency_keys.created_at < now() - make_interval(secs => :ttl)
+RETURNING user_id
+""")
+
+GET_IDEMPOTENCY_KEY = register("get_idempotency_key", """
+SELECT request_hash, response FROM idempotency_keys WHERE user_id = :user_id AND key = :key
+""")
+
+SAVE_IDEMPOTENT_RESPONSE = register("save_idempotent_response", """
+UPDATE idempotency_keys SET response = :response WHERE user_id = :user_id AND key = :key
+""")
+
+
+# -----------------------------
+# Feedback
+# -----------------------------
+INSERT_FEEDBACK = register("insert_feedback", """
+INSERT INTO feedback (user_id, rating, comment)
+VALUES (:user_id, :rating, :comment)
+RETURNING feedback_id, user_id, rating, comment, created_at
+""")
+
+# Write-behind batch insert (feedback_queue.py): one statement for the whole
+# batch; rows come back in submission order
+INSERT_FEEDBACK_BATCH = register("insert_feedback_batch", """
+INSERT INTO feedback (user_id, rating, comment)
+SELECT user_id, rating, comment
+FROM unnest(CAST(:user_ids AS int[]), CAST(:ratings AS int[]), CAST(:comments AS text[]))
+    WITH ORDINALITY AS b(user_id, rating, comment, ord)
+ORDER BY ord
+RETURNING feedback_id, user_id, rating, comment, created_at
+""")
+
+GET_FEEDBACK = register("get_feedback", "SELECT * FROM feedback WHERE feedback_id = :feedback_id")
+
+GET_ALL_FEEDBACK = register("get_all_feedback", """
+SELECT
+    f.feedback_id,
+    f.user_id,
+    f.rating,
+    f.comment,
+    f.created_at,
+    u.name
+FROM feedback f
+LEFT JOIN users u ON f.user_id = u.user_id
+ORDER BY f.created_at DESC
+""")
+
+GET_ALL_FEEDBACK_JSON = register("get_all_feedback_json", """
+SELECT CAST(coalesce(json_agg(f ORDER BY f.created_at DESC), '[]') AS text)
+FROM (
+    SELECT f.feedback_id, f.user_id, f.rating, f.comment, f.created_at, u.name
+    FROM feedback f
+    LEFT JOIN users u ON f.user_id = u.user_id
+) f
+""")
+
+GET_FEEDBACK_STATS = register("get_feedback_stats", "SELECT * FROM feedback_stats WHERE id")
+
+# Feed pages, keyset on (created_at, feedback_id). "latest" and "before" walk
+# back in time; "since" returns entries newer than a cursor, oldest first.
+# created_at is the inserting transaction's start, so a row can commit after
+# rows with later keys: "since" leaves out entries younger than :lag seconds
+# (see FEEDBACK_FEED_LAG), which lets such rows land before a poller moves
+# its cursor past them.
+_FEED_SELECT = """
+SELECT f.feedback_id, f.user_id, f.rating, f.comment, f.created_at, u.name
+FROM feedback f
+LEFT JOIN users u ON f.user_id = u.user_id
+"""
+
+GET_FEEDBACK_FEED = register("get_feedback_feed", _FEED_SELECT + """
+ORDER BY f.created_at DESC, f.feedback_id DESC
+LIMIT :limit
+""")
+
+GET_FEEDBACK_FEED_BEFORE = register("get_feedback_feed_before", _FEED_SELECT + """
+WHERE (f.created_at, f.feedback_id) < (:created_at, :feedback_id)
+ORDER BY f.created_at DESC, f.feedback_id DESC
+LIMIT :limit
+""")
+
+GET_FEEDBACK_FEED_SINCE = register("get_feedback_feed_since", _FEED_SELECT + """
+WHERE (f.created_at, f.feedback_id) > (:created_at, :feedback_id)
+  AND f.created_at < LOCALTIMESTAMP - make_interval(secs => :lag)
+ORDER BY f.created_at, f.feedback_id
+LIMIT :limit
+""")
+
+# Entries created before this are settled (LOCALTIMESTAMP matches the
+# `DEFAULT now()` of the timestamp column)
+GET_FEEDBACK_HORIZON = register("get_feedback_horizon", """
+SELECT LOCALTIMESTAMP - make_interval(secs => :lag)
+""")
+
+UPDATE_FEEDBACK = register("update_feedback", """
+UPDATE feedback
+SET rating = :rating, comment = :comment
+WHERE feedback_id = :feedback_id
+RETURNING feedback_id, user_id, rating, comment, created_at
+""")
+
+DELETE_FEEDBACK = register("delete_feedback", "DELETE FROM feedback WHERE feedback_id = :feedback_id RETURNING *")
@@ -0,0 +1,158 @@
+import asyncio
+import gzip
+import os
+import zlib
+
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Bodies at least this large are compressed in a worker thread so the event
+# loop keeps serving other requests meanwhile
+GZIP_THREAD_THRESHOLD = int(os.getenv("GZIP_THREAD_THRESHOLD", "65536"))
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+
+COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"text/")
+
+# (path prefix, Cache-Control) for GET/HEAD, first match wins. Other methods
+# get no-store. A Cache-Control set by the endpoint itself is kept.
+CACHE_RULES = [
+    ("/stock/cache/stats", "no-store"),
+    ("/stock/autocomplete/stats", "no-store"),
+    ("/stock/export", "private, no-cache"),
+    # Catalog: short shared caching; the ETag makes revalidation a cheap 304
+    ("/stock", "public, max-age=10, stale-while-revalidate=30"),
+    ("/feedback/queue", "no-store"),
+    ("/feedback", "public, max-age=5, stale-while-revalidate=30"),
+    # Per-user data must never be stored by shared caches
+    ("/order", "private, no-store"),
+    ("/cart", "private, no-store"),
+    ("/api", "private, no-store"),
+    ("/analytics/stats", "no-store"),
+    # Rollups only move every refresh interval
+    ("/analytics", "private, max-age=30"),
+    ("/metrics", "no-store"),
+    ("/health", "no-store"),
+]
+
+
+def cache_control_for(method: str, path: str) -> str | None:
+    if method not in ("GET", "HEAD"):
+        return "no-store"
+    for prefix, value in CACHE_RULES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return value
+    return None
+
+
+def _accepts_gzip(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"accept-encoding":
+            return b"gzip" in value.lower()
+    return False
+
+
+def _compressible(headers: list) -> bool:
+    content_type, encoded = b"", False
+    for name, value in headers:
+        if name == b"content-type":
+            content_type = value
+        elif name == b"content-encoding":
+            encoded = True
+    return not encoded and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _with_headers(headers: list, cache_control: str | None, gzipped: bool = False,
+                  length: int | None = None, weak_etag: bool = False) -> list:
+    """Apply Cache-Control, Vary and (when gzipped) the encoding headers."""
+    weak_etag = weak_etag or gzipped
+    out, has_cache_control, vary = [], False, None
+    for name, value in headers:
+        if name == b"cache-control":
+            has_cache_control = True
+        elif name == b"vary":
+            vary = value
+            continue
+        elif gzipped and name == b"content-length":
+            continue
+        elif weak_etag and name == b"etag" and not value.startswith(b"W/"):
+            # The compressed body is a different representation
+            value = b"W/" + value
+        out.append((name, value))
+    if cache_control and not has_cache_control:
+        out.append((b"cache-control", cache_control.encode()))
+    if vary is None:
+        out.append((b"vary", b"Accept-Encoding"))
+    elif b"accept-encoding" not in vary.lower():
+        out.append((b"vary", vary + b", Accept-Encoding"))
+    else:
+        out.append((b"vary", vary))
+    if gzipped:
+        out.append((b"content-encoding", b"gzip"))
+        if length is not None:
+            out.append((b"content-length", str(length).encode()))
+    return out
+
+
+async def _gzip(body: bytes) -> bytes:
+    if len(body) >= GZIP_THREAD_THRESHOLD:
+        return await asyncio.to_thread(gzip.compress, body, GZIP_LEVEL)
+    return gzip.compress(body, GZIP_LEVEL)
+
+
+class ResponsePolicyMiddleware:
+    """
+    Pure ASGI middleware adding Cache-Control (CACHE_RULES) and Vary to every
+    response and gzip-compressing JSON/text bodies of at least GZIP_MIN_SIZE
+    bytes for clients that accept it. Streaming bodies are compressed chunk
+    by chunk as they are sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cache_control = cache_control_for(scope["method"], scope["path"])
+        gzip_ok = COMPRESSION_ENABLED and scope["method"] != "HEAD" and _accepts_gzip(scope)
+        start = None       # held http.response.start while deciding on gzip
+        compressor = None  # zlib stream for streamed bodies
+
+        async def send_wrapper(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if gzip_ok and message["status"] == 200 and _compressible(headers):
+                    start = {**message, "headers": headers}
+                    return  # wait for the first body chunk
+                # A 304 must carry the ETag the gzipped 200 would have had
+                weak = gzip_ok and message["status"] == 304
+                await send({**message, "headers": _with_headers(headers, cache_control, weak_etag=weak)})
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if compressor is None:
+                if not more:
+                    # Whole body in one message: compress it if it is big enough
+                    if len(body) >= GZIP_MIN_SIZE:
+                        body = await _gzip(body)
+                        headers = _with_headers(start["headers"], cache_control, gzipped=True, length=len(body))
+                    else:
+                        headers = _with_headers(start["headers"], cache_control)
+                    await send({**start, "headers": headers})
+                    await send({**message, "body": body})
+                    return
+                compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                await send({**start, "headers": _with_headers(start["headers"], cache_control, gzipped=True)})
+
+            chunk = compressor.compress(body)
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH if more else zlib.Z_FINISH)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
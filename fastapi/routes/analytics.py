@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Query
+from pydantic import BaseModel
+from analytics import rollup_refresher, date_range, revenue_by_day, top_stock, stock_sales, low_stock
+from datetime import date
+from typing import List
+
+router = APIRouter(tags=["analytics"])
+
+DEFAULT_DAYS = 30
+MAX_LIMIT = 100
+
+# -----------------------------
+# Pydantic Models
+# -----------------------------
+class DailySales(BaseModel):
+    day: date
+    orders: int
+    units: int
+    revenue: float
+
+class StockSales(BaseModel):
+    stock_id: int
+    name: str | None  # None once the stock row is deleted
+    orders: int
+    units: int
+    revenue: float
+
+class LowStock(BaseModel):
+    stock_id: int
+    name: str
+    quantity: int
+    units_sold: int
+    days_left: float | None  # None when nothing sold in the window
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+# All reports read the rollup tables, which trail the newest orders by up to
+# ANALYTICS_REFRESH_INTERVAL + ANALYTICS_LAG seconds. Dates are UTC days.
+@router.get("/revenue", response_model=List[DailySales])
+async def get_revenue(start: date | None = None, end: date | None = None):
+    return await revenue_by_day(*date_range(start, end, DEFAULT_DAYS))
+
+
+# Best sellers by units, e.g. ?days=7 for this week
+@router.get("/top-stock", response_model=List[StockSales])
+async def get_top_stock(
+    days: int = Query(7, ge=1, le=366),
+    start: date | None = None,
+    end: date | None = None,
+    limit: int = Query(10, ge=1, le=MAX_LIMIT),
+):
+    return await top_stock(*date_range(start, end, days), limit)
+
+
+@router.get("/stock/{stock_id}", response_model=List[DailySales])
+async def get_stock_sales(stock_id: int, start: date | None = None, end: date | None = None):
+    return await stock_sales(stock_id, *date_range(start, end, DEFAULT_DAYS))
+
+
+# Drones at or under `threshold` units, or with fewer than `cover_days` days
+# left at the average rate of the last `days` days
+@router.get("/low-stock", response_model=List[LowStock])
+async def get_low_stock(
+    threshold: int = Query(10, ge=0),
+    days: int = Query(7, ge=1, le=90),
+    cover_days: int = Query(7, ge=1, le=90),
+    limit: int = Query(50, ge=1, le=MAX_LIMIT),
+):
+    return await low_stock(threshold, days, cover_days, limit)
+
+
+@router.get("/stats")
+async def analytics_stats():
+    return await rollup_refresher.stats()
+
+
+# Fold new orders now; full=true recomputes the rollups from every order
+@router.post("/refresh")
+async def refresh_rollups(full: bool = False):
+    folded = await (rollup_refresher.rebuild() if full else rollup_refresher.refresh())
+    return {"orders": folded}
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from holds import set_hold, get_holds, release_holds, hold_sweeper, HoldUnavailable, UnknownUser
+from datetime import datetime
+from typing import List
+
+router = APIRouter(tags=["cart"])
+
+# -----------------------------
+# Pydantic Models
+# -----------------------------
+class HoldUpdate(BaseModel):
+    quantity: int = Field(..., ge=0)  # 0 releases the hold
+
+class HoldOut(BaseModel):
+    hold_id: int
+    user_id: int
+    stock_id: int
+    quantity: int
+    expires_at: datetime
+
+class CartLine(HoldOut):
+    name: str
+    price: float
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+@router.get("/holds/stats")
+async def hold_stats():
+    return hold_sweeper.stats()
+
+
+# Hold `quantity` units of a drone for the user's cart; sent again with a new
+# quantity to change it. Units on hold are taken out of the catalog quantity
+# until checkout uses them or the hold expires.
+@router.put("/{user_id}/items/{stock_id}", response_model=HoldOut | None)
+async def hold_item(user_id: int, stock_id: int, hold: HoldUpdate):
+    try:
+        return await set_hold(user_id, stock_id, hold.quantity)
+    except HoldUnavailable as e:
+        if not e.found:
+            raise HTTPException(status_code=404, detail=f"Stock ID {stock_id} not found")
+        raise HTTPException(status_code=409, detail=f"Not enough stock for stock_id {stock_id}")
+    except UnknownUser:
+        raise HTTPException(status_code=404, detail="User not found")
+
+
+@router.delete("/{user_id}/items/{stock_id}")
+async def release_item(user_id: int, stock_id: int):
+    await set_hold(user_id, stock_id, 0)
+    return {"detail": "Hold released"}
+
+
+# Active holds; `touch=true` also restarts their TTL (the cart page is open)
+@router.get("/{user_id}", response_model=List[CartLine])
+async def get_cart(user_id: int, touch: bool = False):
+    return await get_holds(user_id, touch)
+
+
+@router.delete("/{user_id}")
+async def clear_cart(user_id: int):
+    released = await release_holds(user_id)
+    return {"detail": "Cart cleared", "released": released}
@@ -1,6 +1,20 @@
-from fastapi import APIRouter, HTTPException
+import os
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel, Field
-from database import insert_feedback, get_feedback, get_all_feedback, update_feedback, delete_feedback
+from database import (
+    get_feedback,
+    get_all_feedback,
+    get_all_feedback_json,
+    get_feedback_stats,
+    get_feedback_feed,
+    get_feedback_horizon,
+    update_feedback,
+    delete_feedback,
+)
+from pagination import encode_cursor, decode_cursor
+from feedback_queue import feedback_writer, QueueFull
+from serializers import FAST_JSON, fast_json_response
+from datetime import datetime
 
 # router = APIRouter(
 #     prefix="/feedback",
@@ -10,6 +24,13 @@ from database import insert_feedback, get_feedback, get_all_feedback, update_fee
 
 router = APIRouter(tags=["feedback"])
 
+DEFAULT_FEED_SIZE = 20
+MAX_FEED_SIZE = 100
+# Seconds an entry must be old before `since` returns it or X-Latest-Cursor
+# moves past it. Must cover the longest feedback insert transaction, which
+# DB_STATEMENT_TIMEOUT_MS bounds (5 s by default).
+FEEDBACK_FEED_LAG = float(os.getenv("FEEDBACK_FEED_LAG", "6"))
+
 # -----------------------------
 # Pydantic Schemas
 # -----------------------------
@@ -22,23 +43,94 @@ class FeedbackUpdate(BaseModel):
     rating: int = Field(..., ge=1, le=5)
     comment: str | None = None
 
+# Shape of a feed entry, used by the FAST_JSON serializer
+class FeedEntry(BaseModel):
+    feedback_id: int
+    user_id: int | None = None
+    rating: int
+    comment: str | None = None
+    created_at: datetime
+    name: str | None = None
+
 # -----------------------------
 # Routes
 # -----------------------------
 
-# Create feedback
+# Create feedback (batched with other submissions by the write-behind queue)
 @router.post("/", response_model=dict)
 async def create_feedback(feedback: FeedbackCreate):
-    result = await insert_feedback(feedback.user_id, feedback.rating, feedback.comment)
+    try:
+        result = await feedback_writer.submit(feedback.user_id, feedback.rating, feedback.comment)
+    except QueueFull:
+        raise HTTPException(
+            status_code=503, detail="Feedback queue is full, try again", headers={"Retry-After": "1"}
+        )
     if not result:
         raise HTTPException(status_code=400, detail="Failed to insert feedback")
     return dict(result)
 
 @router.get("/", response_model=list[dict])
 async def read_all_feedback():
+    if FAST_JSON:
+        # Postgres builds the JSON array; Python only passes the bytes on
+        return Response(content=await get_all_feedback_json(), media_type="application/json")
     result = await get_all_feedback()
     return [dict(r) for r in result]
 
+# Count, average rating and 1-5 histogram, maintained by triggers on insert,
+# update and delete, so this is a single-row read
+@router.get("/summary")
+async def read_feedback_summary():
+    stats = await get_feedback_stats()
+    total = stats["total"] if stats else 0
+    return {
+        "count": total,
+        "average_rating": round(stats["rating_sum"] / total, 2) if total else None,
+        "histogram": {str(r): stats[f"rating_{r}"] if stats else 0 for r in range(1, 6)},
+    }
+
+# Paginated feed, newest first.
+# `before` (the X-Next-Cursor of a page) walks back to older entries; `since`
+# (the X-Latest-Cursor of a page) returns only entries added after it, once
+# they are FEEDBACK_FEED_LAG seconds old. The latest cursor never passes that
+# horizon, so a poller may see an entry from its first page again (dedupe
+# by feedback_id) but never misses one that committed late.
+@router.get("/feed", response_model=list[dict])
+async def read_feedback_feed(
+    response: Response,
+    limit: int = Query(DEFAULT_FEED_SIZE, ge=1, le=MAX_FEED_SIZE),
+    before: str | None = None,
+    since: str | None = None,
+):
+    if before and since:
+        raise HTTPException(status_code=400, detail="Use either before or since, not both")
+    rows = await get_feedback_feed(limit + 1, decode_cursor(before), decode_cursor(since), FEEDBACK_FEED_LAG)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if since:
+        rows.reverse()  # fetched oldest first so no new entry is skipped
+    if rows:
+        newest, oldest = rows[0], rows[-1]
+        if since:
+            latest = (newest["created_at"], newest["feedback_id"])  # all settled
+        else:
+            horizon = await get_feedback_horizon(FEEDBACK_FEED_LAG)
+            settled = next((r for r in rows if r["created_at"] < horizon), None)
+            latest = (settled["created_at"], settled["feedback_id"]) if settled else (horizon, 0)
+        response.headers["X-Latest-Cursor"] = encode_cursor(*latest)
+        if more and not since:
+            response.headers["X-Next-Cursor"] = encode_cursor(oldest["created_at"], oldest["feedback_id"])
+    elif since:
+        response.headers["X-Latest-Cursor"] = since
+    if FAST_JSON:
+        headers = {k: v for k, v in response.headers.items() if k.startswith("x-")}
+        return fast_json_response(rows, FeedEntry, headers)
+    return rows
+
+@router.get("/queue/stats")
+async def read_queue_stats():
+    return feedback_writer.stats()
+
 @router.get("/{feedback_id}", response_model=dict)
 async def read_feedback(feedback_id: int):
     result = await get_feedback(feedback_id)
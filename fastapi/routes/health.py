@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from database import database, pool_stats
+from instrumentation import loop_lag
+import time
+
+router = APIRouter(tags=["health"])
+
+
+# Database health: round-trip a trivial query and report pool usage
+@router.get("/db")
+async def health_db():
+    stats = pool_stats.snapshot()
+    start = time.perf_counter()
+    try:
+        await database.fetch_val("SELECT 1")
+    except Exception as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "error": str(e), "pool": stats},
+        )
+    latency_ms = (time.perf_counter() - start) * 1000
+    return {"status": "ok", "latency_ms": round(latency_ms, 2), "pool": pool_stats.snapshot()}
+
+
+# Event-loop lag samples since startup (the load test diffs two reads)
+@router.get("/loop")
+async def health_loop():
+    return loop_lag.stats()
@@ -0,0 +1,85 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics import MetricsText
+from instrumentation import render_route_metrics, loop_lag
+from database import pool_stats
+from cache import catalog_cache
+from feedback_queue import feedback_writer
+from holds import hold_sweeper
+import admission
+from analytics import rollup_refresher
+import passwords
+import singleflight
+
+router = APIRouter(tags=["metrics"])
+
+
+# Prometheus scrape endpoint
+@router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    out = MetricsText()
+    render_route_metrics(out)
+
+    out.header("event_loop_lag_seconds", "histogram", "Delay before the event loop resumes a ready task.")
+    out.histogram("event_loop_lag_seconds", loop_lag.lag)
+    out.header("event_loop_lag_max_seconds", "gauge", "Largest event-loop lag sampled.")
+    out.sample("event_loop_lag_max_seconds", loop_lag.max_lag)
+
+    pool = pool_stats.snapshot()
+    if pool["connected"]:
+        for key in ("size", "idle", "in_use", "waiting", "queued"):
+            out.header(f"db_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}.")
+            out.sample(f"db_pool_{key}", pool[key])
+    out.header("db_pool_acquire_timeouts_total", "counter", "Pool acquires that timed out.")
+    out.sample("db_pool_acquire_timeouts_total", pool_stats.timeouts)
+    out.header("db_pool_acquire_wait_seconds", "histogram", "Time spent waiting for a pooled connection.")
+    out.histogram("db_pool_acquire_wait_seconds", pool_stats.acquire_wait)
+
+    cache = catalog_cache.stats()
+    for key in ("hits", "misses", "invalidations"):
+        out.header(f"catalog_cache_{key}_total", "counter", f"Stock catalog cache {key}.")
+        out.sample(f"catalog_cache_{key}_total", cache[key])
+
+    for name, histogram in (
+        ("password_hash_seconds", passwords.hash_latency),
+        ("password_verify_seconds", passwords.verify_latency),
+        ("password_queue_wait_seconds", passwords.queue_wait),
+    ):
+        out.header(name, "histogram", f"Password KDF {name.split('_')[1]} latency.")
+        out.histogram(name, histogram)
+
+    queue = feedback_writer.stats()
+    out.header("feedback_queue_depth", "gauge", "Feedback submissions waiting to be written.")
+    out.sample("feedback_queue_depth", queue["queued"])
+    for key in ("batches", "written", "rejected"):
+        out.header(f"feedback_queue_{key}_total", "counter", f"Feedback write-behind {key}.")
+        out.sample(f"feedback_queue_{key}_total", queue[key])
+
+    flights = singleflight.stats()
+    out.header("single_flight_calls_total", "counter", "Calls to single-flight read helpers.")
+    for name, counts in flights.items():
+        out.sample("single_flight_calls_total", counts["calls"], {"function": name})
+    out.header("single_flight_merged_total", "counter", "Calls that shared another caller's in-flight query.")
+    for name, counts in flights.items():
+        out.sample("single_flight_merged_total", counts["merged"], {"function": name})
+
+    holds = hold_sweeper.stats()
+    out.header("stock_holds_expired_total", "counter", "Expired stock holds returned to stock.")
+    out.sample("stock_holds_expired_total", holds["returned"])
+
+    out.header("sales_rollup_orders_total", "counter", "Orders folded into the sales rollups.")
+    out.sample("sales_rollup_orders_total", rollup_refresher.orders)
+    out.header("sales_rollup_refresh_seconds", "gauge", "Duration of the last sales rollup refresh.")
+    out.sample("sales_rollup_refresh_seconds", rollup_refresher.last_duration)
+
+    limits = admission.stats()
+    out.header("rate_limited_total", "counter", "Requests rejected with 429 by rate limit rule.")
+    for rule, count in sorted(limits["limited"].items()):
+        out.sample("rate_limited_total", count, {"rule": rule})
+    out.header("load_shed_total", "counter", "Requests rejected with 503 by priority.")
+    for priority, count in limits["shed"].items():
+        out.sample("load_shed_total", count, {"priority": priority})
+    out.header("rate_limit_buckets", "gauge", "Token buckets held in memory.")
+    out.sample("rate_limit_buckets", limits["buckets"])
+
+    return out.render()
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from pydantic import BaseModel
-from database import database
+from database import get_order as fetch_order, get_user_orders as fetch_user_orders
+from checkout import place_order, place_order_once, CheckoutError
+from idempotency import idempotency_store, request_fingerprint, IdempotencyConflict
+from pagination import encode_cursor, decode_cursor
+from serializers import FAST_JSON, fast_json_response
 from datetime import datetime
 from typing import List
-import json
 
 router = APIRouter(tags=["orders"])
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 # -----------------------------
 # Pydantic Models
 # -----------------------------
@@ -25,90 +31,99 @@ class OrderOut(OrderCreate):
     order_id: int
     created_at: datetime
 
+class OrderSummary(BaseModel):
+    order_id: int
+    user_id: int
+    address_id: int
+    total_price: float
+    created_at: datetime
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+async def order_history_page(user_id, limit, before, summary, response: Response):
+    # Fetch one extra row to know whether another page follows
+    rows = await fetch_user_orders(user_id, limit + 1, decode_cursor(before), summary)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1]["created_at"], rows[-1]["order_id"])
+    if FAST_JSON:
+        return fast_json_response(rows, OrderSummary if summary else OrderOut, headers)
+    response.headers.update(headers)
+    return rows
+
 
 # -----------------------------
 # Endpoints
 # -----------------------------
 @router.post("/", response_model=OrderOut)
-async def create_order(order: OrderCreate):
-    # 1. Validate all stock items exist and have enough quantity
-    for item in order.items:
-        stock = await database.fetch_one(
-            "SELECT quantity FROM stock WHERE stock_id = :id",
-            {"id": item.stock_id},
-        )
-        if not stock:
-            raise HTTPException(
-                status_code=404, detail=f"Stock ID {item.stock_id} not found"
-            )
-        if stock["quantity"] < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Not enough stock for stock_id {item.stock_id}",
-            )
-
-    # 2. Deduct stock quantities
-    for item in order.items:
-        await database.execute(
-            "UPDATE stock SET quantity = quantity - :qty WHERE stock_id = :id",
-            {"qty": item.quantity, "id": item.stock_id},
+async def create_order(
+    order: OrderCreate,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=255),
+):
+    # Validate, decrement stock and create the order in a single transaction.
+    # With an Idempotency-Key, retries of the same order return the first
+    # result instead of placing it again.
+    items = [item.dict() for item in order.items]
+    try:
+        if idempotency_key is None:
+            return await place_order(order.user_id, order.address_id, order.total_price, items)
+        result, replayed = await place_order_once(
+            idempotency_key,
+            request_fingerprint(order.dict()),
+            order.user_id,
+            order.address_id,
+            order.total_price,
+            items,
         )
-
-    # 3. Create order (items as JSON)
-    query = """
-    INSERT INTO orders (user_id, address_id, total_price, items, created_at)
-    VALUES (:user_id, :address_id, :total_price, :items, :created_at)
-    RETURNING order_id, user_id, address_id, total_price, items, created_at
-    """
-
-    values = {
-        "user_id": order.user_id,
-        "address_id": order.address_id,
-        "total_price": order.total_price,
-        "items": json.dumps([item.dict() for item in order.items]),
-        "created_at": datetime.utcnow(),
-    }
-
-    # try:
-    #     new_order = await database.fetch_one(query=query, values=values)
-    #     if new_order:
-    #         new_order = dict(new_order)
-    #         new_order["items"] = json.loads(new_order["items"])
-    # except Exception as e:
-    #     raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    new_order = await database.fetch_one(query=query, values=values)
-    if new_order:
-        new_order = dict(new_order)
-        new_order["items"] = json.loads(new_order["items"])
-
-    return new_order
-
-
-# Get all orders for a specific user
+    except CheckoutError as e:
+        if e.missing:
+            ids = ", ".join(map(str, e.missing))
+            raise HTTPException(status_code=404, detail=f"Stock ID {ids} not found")
+        ids = ", ".join(map(str, e.short))
+        raise HTTPException(status_code=400, detail=f"Not enough stock for stock_id {ids}")
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different order")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+@router.get("/idempotency/stats")
+async def idempotency_stats():
+    return idempotency_store.stats()
+
+
+# Get a user's orders, newest first, one page at a time.
+# Pass the X-Next-Cursor header of a response as `before` for the next page.
 @router.get("/user/{user_id}", response_model=List[OrderOut])
-async def get_user_orders(user_id: int):
-    query = "SELECT * FROM orders WHERE user_id = :user_id ORDER BY created_at DESC"
-    orders = await database.fetch_all(query=query, values={"user_id": user_id})
-
-    orders_list = []
-    for order in orders:
-        order_dict = dict(order)
-        order_dict["items"] = json.loads(order_dict["items"])
-        orders_list.append(order_dict)
-
-    return orders_list
+async def get_user_orders(
+    user_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: str | None = None,
+):
+    return await order_history_page(user_id, limit, before, False, response)
+
+
+# Same history without the items payload
+@router.get("/user/{user_id}/summary", response_model=List[OrderSummary])
+async def get_user_order_summaries(
+    user_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: str | None = None,
+):
+    return await order_history_page(user_id, limit, before, True, response)
 
 
 # Get a single order by ID
 @router.get("/{order_id}", response_model=OrderOut)
 async def get_order(order_id: int):
-    query = "SELECT * FROM orders WHERE order_id = :order_id"
-    order = await database.fetch_one(query=query, values={"order_id": order_id})
-
+    order = await fetch_order(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-
-    order_dict = dict(order)
-    order_dict["items"] = json.loads(order_dict["items"])
-
-    return order_dict
\ No newline at end of file
+    return order
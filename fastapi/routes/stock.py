@@ -1,10 +1,29 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from database import database
+from database import (
+    insert_stock,
+    list_stock,
+    iter_stock,
+    get_all_stock as get_all_stock_rows,
+    get_all_stock_json,
+    delete_stock as delete_stock_row,
+)
+from cache import catalog_cache, etag_matches
+from holds import update_stock as update_stock_row, HeldAboveStock
+from stock_io import import_stock, export_stock, ImportRowError
+from search import search_stock as run_search, autocomplete, trigram_index
+from serializers import FAST_JSON, serializer_for, encode_rows, dumps
 from typing import List
+import json
 
 router = APIRouter(tags=["stock"])
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_SEARCH_SIZE = 20
+MAX_SEARCH_SIZE = 100
+
 # -----------------------------
 # Pydantic Models
 # -----------------------------
@@ -24,41 +43,138 @@ class StockOut(StockCreate):
 # Create stock item
 @router.post("/", response_model=StockOut)
 async def create_stock(stock: StockCreate):
-    query = """
-    INSERT INTO stock (name, description, price, quantity)
-    VALUES (:name, :description, :price, :quantity)
-    RETURNING stock_id, name, description, price, quantity
-    """
-    values = stock.dict()
-    return await database.fetch_one(query=query, values=values)
-
-# Get all stock items
+    result = await insert_stock(stock.name, stock.description, stock.price, stock.quantity)
+    catalog_cache.invalidate()
+    return result
+
+async def load_catalog() -> bytes:
+    if FAST_JSON:
+        return (await get_all_stock_json()).encode()
+    rows = await get_all_stock_rows()
+    return json.dumps([StockOut(**r).dict() for r in rows]).encode()
+
+async def stream_ndjson(rows):
+    # `rows` reads through a server-side cursor, so only one batch of rows is
+    # held in memory at a time
+    if FAST_JSON:
+        serialize = serializer_for(StockOut)
+        async for row in rows:
+            yield dumps(serialize(row)) + b"\n"
+        return
+    async for row in rows:
+        yield json.dumps(StockOut(**row).dict()) + "\n"
+
+# Get all stock items.
+# Without parameters the whole catalog is served from the cache (304 if
+# unchanged): index.js expects the full list, so that response is unbounded,
+# one cached body per process. `limit`/`after` page through it by stock_id,
+# the price and in_stock filters run in SQL, and format=ndjson streams every
+# matching row.
 @router.get("/", response_model=List[StockOut])
-async def get_all_stock():
-    query = "SELECT * FROM stock"
-    return await database.fetch_all(query=query)
+async def get_all_stock(
+    request: Request,
+    after: int | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    min_price: float | None = None,
+    max_price: float | None = None,
+    in_stock: bool = False,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    if format == "ndjson":
+        rows = iter_stock(after, min_price, max_price, in_stock, limit)
+        return StreamingResponse(stream_ndjson(rows), media_type="application/x-ndjson")
+
+    paged = (after, limit, min_price, max_price) != (None, None, None, None) or in_stock
+    if not paged:
+        body, etag = await catalog_cache.get(load_catalog)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+    # Fetch one extra row to know whether another page follows
+    limit = limit or DEFAULT_PAGE_SIZE
+    rows = await list_stock(after, min_price, max_price, in_stock, limit + 1)
+    headers = {}
+    if len(rows) > limit:
+        headers["X-Next-Cursor"] = str(rows[limit - 1]["stock_id"])
+    if FAST_JSON:
+        body = encode_rows(rows[:limit], StockOut)
+    else:
+        body = json.dumps([StockOut(**r).dict() for r in rows[:limit]])
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Ranked full-text search over name and description; the last word matches
+# as a prefix. Returns the top `limit` items, the total match count and
+# price facet counts.
+@router.get("/search")
+async def search_stock(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_SEARCH_SIZE, ge=1, le=MAX_SEARCH_SIZE),
+    min_price: float | None = None,
+    max_price: float | None = None,
+    in_stock: bool = False,
+):
+    return await run_search(q, limit, min_price, max_price, in_stock)
+
+# Type-ahead suggestions (stock_id and name only)
+@router.get("/autocomplete")
+async def autocomplete_stock(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    return await autocomplete(q, limit)
+
+@router.get("/autocomplete/stats")
+async def autocomplete_stats():
+    return trigram_index.stats()
+
+# Bulk import: stream a CSV (header row: stock_id,name,description,price,quantity)
+# or NDJSON body. Rows with a stock_id replace that item, rows without one
+# are added. All or nothing: a bad line rejects the whole upload.
+@router.post("/import")
+async def bulk_import_stock(request: Request, format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    try:
+        return await import_stock(request.stream(), format)
+    except ImportRowError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HeldAboveStock as e:
+        ids = ", ".join(map(str, e.stock_ids))
+        raise HTTPException(status_code=409, detail=f"More units are held in carts than imported for stock_id {ids}")
+
+# Bulk export of the whole catalog, streamed straight from COPY
+@router.get("/export")
+async def bulk_export_stock(format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_stock(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="stock.{format}"'},
+    )
+
+# Catalog cache hit/miss counters
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return catalog_cache.stats()
 
 # Update stock item
 @router.put("/{stock_id}", response_model=StockOut)
 async def update_stock(stock_id: int, stock: StockCreate):
-    query = """
-    UPDATE stock
-    SET name = :name, description = :description, price = :price, quantity = :quantity
-    WHERE stock_id = :stock_id
-    RETURNING stock_id, name, description, price, quantity
-    """
-    values = stock.dict()
-    values["stock_id"] = stock_id
-    result = await database.fetch_one(query=query, values=values)
+    # quantity is the number on hand, and the response echoes it; the catalog
+    # shows it minus the units held in carts
+    try:
+        result = await update_stock_row(stock_id, stock.name, stock.description, stock.price, stock.quantity)
+    except HeldAboveStock:
+        raise HTTPException(status_code=409, detail=f"More units of stock_id {stock_id} are held in carts")
     if not result:
         raise HTTPException(status_code=404, detail="Stock item not found")
+    catalog_cache.invalidate()
     return result
 
 # Delete stock item
 @router.delete("/{stock_id}")
 async def delete_stock(stock_id: int):
-    query = "DELETE FROM stock WHERE stock_id = :stock_id RETURNING *"
-    result = await database.fetch_one(query=query, values={"stock_id": stock_id})
+    result = await delete_stock_row(stock_id)
     if not result:
         raise HTTPException(status_code=404, detail="Stock item not found")
+    catalog_cache.invalidate()
     return {"message": "Stock item deleted successfully"}
@@ -1,8 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, EmailStr, constr
 from datetime import datetime
-from database import database, insert_address, get_address, update_address
-import hashlib
+from database import (
+    register_user,
+    get_user_by_email,
+    update_user_name,
+    update_password_hash,
+    insert_address,
+    get_address,
+    upsert_default_address,
+    set_default_address,
+    get_checkout_context as fetch_checkout_context,
+)
+from passwords import hash_password, verify_password, needs_rehash
+from sessions import issue_token, revoke_token, bearer_token, current_session
+import asyncpg
+import passwords
 import re
 
 router = APIRouter(tags=["users"])
@@ -10,10 +23,6 @@ router = APIRouter(tags=["users"])
 # -----------------------------
 # Helpers
 # -----------------------------
-def hash_password(password: str) -> str:
-    """Hash password using SHA256 (demo only)."""
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def validate_password(password: str):
     """Password must be at least 10 chars and contain a number."""
     if len(password) < 10:
@@ -56,6 +65,10 @@ class AddressCreate(BaseModel):
 
 class AddressOut(AddressCreate):
     id: int
+    is_default: bool = False
+
+class CheckoutContext(UserOut):
+    address: AddressOut | None = None
 
 
 # -----------------------------
@@ -66,16 +79,9 @@ class AddressOut(AddressCreate):
 @router.post("/register/", response_model=UserOut)
 async def register(user: UserCreate):
     validate_password(user.password)
-    hashed = hash_password(user.password)
-    query = """
-        INSERT INTO users (email, password_hash, name , surname ,created_at)
-        VALUES (:email, :password_hash, :name, :surname, :created_at)
-        RETURNING user_id, email, name, surname, created_at
-    """
-    values = {"email": user.email, "password_hash": hashed,"name" : user.name , "surname" : user.surname ,"created_at": datetime.utcnow()}
+    hashed = await hash_password(user.password)
     try:
-        result = await database.fetch_one(query, values)
-        return result
+        return await register_user(user.email, hashed, user.name, user.surname)
     except Exception:
         raise HTTPException(status_code=400, detail="User already exists or invalid input")
 
@@ -83,32 +89,48 @@ async def register(user: UserCreate):
 # Login
 @router.post("/login/")
 async def login(user: UserCreate):
-    query = "SELECT user_id, email, password_hash, name, surname, created_at FROM users WHERE email = :email"
-    db_user = await database.fetch_one(query, {"email": user.email})
+    db_user = await get_user_by_email(user.email)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    if db_user["password_hash"] != hash_password(user.password):
+    if not await verify_password(user.password, db_user["password_hash"]):
         raise HTTPException(status_code=401, detail="Incorrect password")
+    # Upgrade legacy SHA-256 or lower-cost hashes now that we know the password
+    if needs_rehash(db_user["password_hash"]):
+        await update_password_hash(db_user["user_id"], await hash_password(user.password))
     return {
         "message": "Login successful",
         "email": db_user["email"],
         "user_id": db_user["user_id"],
         "name": db_user["name"],
-        "surname": db_user["surname"]
+        "surname": db_user["surname"],
+        "token": issue_token(db_user["user_id"]),
     }
 
 
+# Logout: revoke the caller's session token
+@router.post("/logout/")
+async def logout(token: str = Depends(bearer_token)):
+    if not revoke_token(token):
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return {"message": "Logout successful"}
+
+
+# Resolve the session token without touching the users table
+@router.get("/session/")
+async def read_session(session: dict = Depends(current_session)):
+    return {"user_id": session["uid"], "expires_at": session["exp"]}
+
+
+# Password hashing latency histograms
+@router.get("/password-hashing/stats")
+async def password_hashing_stats():
+    return passwords.stats()
+
+
 # Update user info (name, surname)
 @router.put("/user/{user_id}", response_model=UserOut)
 async def update_user_info(user_id: int, user: UserUpdate):
-    query = """
-        UPDATE users
-        SET name = :name, surname = :surname
-        WHERE user_id = :user_id
-        RETURNING user_id, email, name, surname, created_at
-    """
-    values = {"user_id": user_id, "name": user.name, "surname": user.surname}
-    result = await database.fetch_one(query, values)
+    result = await update_user_name(user_id, user.name, user.surname)
     if not result:
         raise HTTPException(status_code=404, detail="User not found")
     return result
@@ -139,16 +161,33 @@ async def get_user_address(user_id: int):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# Create or replace the user's default address (one statement, no read first)
 @router.put("/address/{user_id}", response_model=AddressOut)
 async def update_user_address(user_id: int, address: AddressCreate):
-    existing = await get_address(user_id)
-    if not existing:
+    try:
+        return await upsert_default_address(
+            user_id=user_id,
+            street=address.street,
+            city=address.city,
+            postal_code=address.postal_code,
+            country=address.country,
+        )
+    except asyncpg.ForeignKeyViolationError:
+        raise HTTPException(status_code=404, detail="User not found")
+
+
+@router.put("/address/{user_id}/default/{address_id}", response_model=AddressOut)
+async def make_default_address(user_id: int, address_id: int):
+    result = await set_default_address(user_id, address_id)
+    if not result:
         raise HTTPException(status_code=404, detail="Address not found")
-    address_id = existing[0]["id"]  # take the first address
-    return await update_address(
-        id=address_id,
-        street=address.street,
-        city=address.city,
-        postal_code=address.postal_code,
-        country=address.country
-    )
+    return result
+
+
+# User and default address in one query, for the checkout and profile pages
+@router.get("/checkout-context/{user_id}", response_model=CheckoutContext)
+async def get_user_checkout_context(user_id: int):
+    context = await fetch_checkout_context(user_id)
+    if not context:
+        raise HTTPException(status_code=404, detail="User not found")
+    return context
@@ -0,0 +1,208 @@
+import asyncio
+import heapq
+import os
+import re
+import time
+from collections import defaultdict
+from database import query_one, query_all
+import queries as q
+
+# Price facet bucket edges (THB); results are counted per [edge, next edge)
+PRICE_FACET_BOUNDS = [
+    float(b) for b in os.getenv("PRICE_FACET_BOUNDS", "5000,10000,20000,40000").split(",")
+]
+# Serve /stock/autocomplete from an in-process trigram index instead of SQL
+AUTOCOMPLETE_INDEX = os.getenv("AUTOCOMPLETE_INDEX", "0") == "1"
+AUTOCOMPLETE_REFRESH = float(os.getenv("AUTOCOMPLETE_REFRESH", "60"))
+
+_WORD = re.compile(r"\w+")
+
+
+def build_tsquery(text: str) -> str | None:
+    """
+    Turn free text into a safe to_tsquery() argument: words are ANDed and
+    the last one matches as a prefix for type-ahead. None if no words.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    return " & ".join(words[:-1] + [words[-1] + ":*"])
+
+
+def price_facets(rows: list[dict]) -> list[dict]:
+    edges = [None] + PRICE_FACET_BOUNDS + [None]
+    return [
+        {"min": edges[row["bucket"]], "max": edges[row["bucket"] + 1], "count": row["count"]}
+        for row in rows
+    ]
+
+
+# -----------------------------
+# Full-text search
+# -----------------------------
+async def search_stock(
+    text: str,
+    limit: int,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    in_stock: bool = False,
+) -> dict:
+    tsquery = build_tsquery(text)
+    if tsquery is None:
+        return {"total": 0, "items": [], "facets": {"price": []}}
+    row = await query_one(
+        q.SEARCH_STOCK,
+        tsquery=tsquery,
+        in_stock=in_stock,
+        min_price=min_price,
+        max_price=max_price,
+        limit=limit,
+        bounds=PRICE_FACET_BOUNDS,
+    )
+    return {
+        "total": row["total"],
+        "items": row["items"],
+        "facets": {"price": price_facets(row["price_facets"])},
+    }
+
+
+# -----------------------------
+# Autocomplete
+# -----------------------------
+def trigrams(word: str) -> set[str]:
+    """Trigrams of one word, padded like pg_trgm ("  d", " dr", "dro", ...)."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index over stock names for type-ahead.
+
+    Names share a small vocabulary, so trigrams index distinct words and each
+    word lists the stock_ids whose name contains it. A query word matches
+    vocabulary words that start with it or are similar enough by trigrams
+    (typos); a name must match every query word. Lookups never touch the
+    database. The index is rebuilt every AUTOCOMPLETE_REFRESH seconds in a
+    worker thread while queries keep using the previous one.
+    """
+
+    SIMILARITY = 0.3  # pg_trgm's default similarity threshold
+
+    def __init__(self, refresh: float = AUTOCOMPLETE_REFRESH):
+        self.refresh = refresh
+        self.names = {}  # stock_id -> name
+        self.words = {}  # word -> stock_ids
+        self.grams = {}  # trigram -> words
+        self.gram_counts = {}  # word -> number of distinct trigrams
+        self.built_at = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _build(rows: list[dict]):
+        names = {row["stock_id"]: row["name"] for row in rows}
+        words = defaultdict(set)
+        for stock_id, name in names.items():
+            for word in _WORD.findall(name.lower()):
+                words[word].add(stock_id)
+        grams = defaultdict(set)
+        gram_counts = {}
+        for word in words:
+            word_grams = trigrams(word)
+            gram_counts[word] = len(word_grams)
+            for gram in word_grams:
+                grams[gram].add(word)
+        return names, dict(words), dict(grams), gram_counts
+
+    async def ensure_fresh(self):
+        if self.built_at is not None and time.monotonic() - self.built_at < self.refresh:
+            return
+        if self._lock.locked() and self.built_at is not None:
+            return  # a rebuild is running; keep serving the current index
+        async with self._lock:
+            if self.built_at is not None and time.monotonic() - self.built_at < self.refresh:
+                return
+            rows = await query_all(q.GET_STOCK_NAMES)
+            self.names, self.words, self.grams, self.gram_counts = await asyncio.to_thread(self._build, rows)
+            self.built_at = time.monotonic()
+
+    def _match_word(self, term: str) -> dict[str, float]:
+        """Vocabulary words for one query word -> score (exact 1, prefix 0.95)."""
+        term_grams = trigrams(term)
+        shared = defaultdict(int)
+        for gram in term_grams:
+            for word in self.grams.get(gram, ()):
+                shared[word] += 1
+        scores = {}
+        for word, n in shared.items():
+            if word == term:
+                scores[word] = 1.0
+            elif word.startswith(term):
+                scores[word] = 0.95
+            else:
+                # Jaccard like pg_trgm: shared / |term grams ∪ word grams|
+                similarity = n / (len(term_grams) + self.gram_counts[word] - n)
+                if similarity >= self.SIMILARITY:
+                    scores[word] = similarity
+        return scores
+
+    def _term_levels(self, term: str) -> dict[float, set]:
+        """score -> stock_ids whose best word match for `term` has that score."""
+        by_score = defaultdict(list)
+        for word, score in self._match_word(term).items():
+            by_score[score].append(self.words[word])
+        levels, seen = {}, set()
+        for score in sorted(by_score, reverse=True):
+            sets = by_score[score]
+            # Posting sets are shared with the index: copy only when merging
+            ids = sets[0] if len(sets) == 1 else set().union(*sets)
+            if seen:
+                ids = ids - seen
+            if ids:
+                levels[score] = ids
+                if len(by_score) > 1:
+                    seen = seen | ids
+        return levels
+
+    def lookup(self, text: str, limit: int) -> list[dict]:
+        """Best matching names; ties go to the lowest stock_id."""
+        terms = _WORD.findall(text.lower())
+        if not terms:
+            return []
+        # Work on sets of ids per score level so intersections stay in C
+        levels = self._term_levels(terms[0])
+        for term in terms[1:]:
+            combined = defaultdict(set)
+            for score, ids in levels.items():
+                for term_score, term_ids in self._term_levels(term).items():
+                    both = ids & term_ids
+                    if both:
+                        combined[score + term_score] |= both
+            levels = combined
+        best = []
+        for score in sorted(levels, reverse=True):
+            best += heapq.nsmallest(limit - len(best), levels[score])
+            if len(best) >= limit:
+                break
+        return [{"stock_id": i, "name": self.names[i]} for i in best]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": AUTOCOMPLETE_INDEX,
+            "names": len(self.names),
+            "words": len(self.words),
+            "age": None if self.built_at is None else time.monotonic() - self.built_at,
+        }
+
+
+trigram_index = TrigramIndex()
+
+
+async def autocomplete(text: str, limit: int) -> list[dict]:
+    if AUTOCOMPLETE_INDEX:
+        await trigram_index.ensure_fresh()
+        return trigram_index.lookup(text, limit)
+    tsquery = build_tsquery(text)
+    if tsquery is None:
+        return []
+    return await query_all(q.AUTOCOMPLETE_STOCK, tsquery=tsquery, limit=limit)
@@ -0,0 +1,91 @@
+"""
+Fast JSON path for list endpoints (FAST_JSON=1).
+
+Rows from the database are trusted: instead of validating every row through
+its response model, each model is compiled once into a plain function that
+projects the model's fields from a row and converts the few types JSON cannot
+hold (numeric -> float, timestamps -> ISO 8601). Bodies are encoded with
+orjson when it is installed, otherwise with the stdlib encoder.
+"""
+import json
+import os
+import types
+import typing
+from datetime import date, datetime
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+
+
+def _unwrap_optional(annotation):
+    """`X | None` / Optional[X] -> (X, True); anything else -> (annotation, False)."""
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0], True
+    return annotation, False
+
+
+def _expression(access: str, annotation) -> str:
+    base, optional = _unwrap_optional(annotation)
+    if base is float:
+        convert = "float({})"
+    elif base in (datetime, date) and orjson is None:
+        convert = "{}.isoformat()"
+    else:
+        # int/str/bool, nested JSONB values and (with orjson) datetimes as-is
+        return access
+    if optional:
+        return f"(None if (v := {access}) is None else {convert.format('v')})"
+    return convert.format(access)
+
+
+def compile_serializer(model):
+    """
+    Build `serialize(row) -> dict` for a pydantic model. Required fields are
+    read with row[name]; optional ones fall back to the model default.
+    """
+    fields, defaults = [], {}
+    for name, field in model.model_fields.items():
+        if field.is_required():
+            access = f"r[{name!r}]"
+        else:
+            defaults[name] = field.default
+            access = f"r.get({name!r}, _defaults[{name!r}])"
+        fields.append(f"    {name!r}: {_expression(access, field.annotation)},")
+    source = "def serialize(r):\n    return {\n" + "\n".join(fields) + "\n    }\n"
+    namespace = {"_defaults": defaults}
+    exec(compile(source, f"<serializer {model.__name__}>", "exec"), namespace)
+    serialize = namespace["serialize"]
+    serialize.source = source
+    return serialize
+
+
+_serializers = {}
+
+
+def serializer_for(model):
+    if model not in _serializers:
+        _serializers[model] = compile_serializer(model)
+    return _serializers[model]
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def encode_rows(rows, model) -> bytes:
+    serialize = serializer_for(model)
+    return dumps([serialize(r) for r in rows])
+
+
+def fast_json_response(rows, model, headers: dict | None = None) -> Response:
+    """JSON response built from trusted rows, skipping response_model validation."""
+    return Response(content=encode_rows(rows, model), media_type="application/json", headers=headers)
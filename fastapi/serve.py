@@ -0,0 +1,42 @@
+"""
+Production entry point: `python serve.py`.
+
+Runs uvicorn without reload, with WEB_CONCURRENCY worker processes (default:
+one per core). Each worker gets an even share of DB_POOL_BUDGET connections
+when it is set. uvloop and httptools are used when installed. On SIGTERM
+the workers stop accepting connections, finish in-flight requests for up to
+GRACEFUL_TIMEOUT seconds and then run the lifespan shutdown.
+"""
+import os
+import uvicorn
+import config
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+KEEPALIVE_TIMEOUT = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+
+
+def main():
+    # Fail here rather than in every worker (see sessions.py)
+    if config.WEB_CONCURRENCY > 1 and not os.getenv("SESSION_SECRET"):
+        raise SystemExit("SESSION_SECRET must be set when running more than one worker")
+    # Worker processes read this back in config.py to size their pool share
+    os.environ["WEB_CONCURRENCY"] = str(config.WEB_CONCURRENCY)
+    uvicorn.run(
+        "app:app",
+        host=HOST,
+        port=PORT,
+        workers=config.WEB_CONCURRENCY,
+        loop="auto",  # uvloop if installed
+        http="auto",  # httptools if installed
+        lifespan="on",
+        proxy_headers=True,
+        access_log=False,
+        timeout_keep_alive=KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    main()
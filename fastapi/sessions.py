@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Header, HTTPException
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Every worker must share the same secret or tokens issued by one worker are
+# rejected by the others; the random fallback is only fit for a single process.
+# serve.py exports WEB_CONCURRENCY to its workers.
+if not os.getenv("SESSION_SECRET") and int(os.getenv("WEB_CONCURRENCY") or "1") > 1:
+    raise RuntimeError("SESSION_SECRET must be set when running more than one worker")
+SESSION_SECRET = os.getenv("SESSION_SECRET") or secrets.token_hex(32)
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+REVOKED_TOKENS_MAX = int(os.getenv("REVOKED_TOKENS_MAX", "100000"))
+
+_key = SESSION_SECRET.encode()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_key, payload.encode(), hashlib.sha256).digest())
+
+
+def _signature_matches(payload: str, signature: str) -> bool:
+    # compare_digest only accepts ASCII str, so compare bytes: a token with
+    # other characters must fail verification, not raise
+    return hmac.compare_digest(signature.encode(), _sign(payload).encode())
+
+
+# -----------------------------
+# Revocation list
+# -----------------------------
+class RevokedTokens:
+    """
+    Bounded list of revoked token ids in revocation order, which with a
+    uniform SESSION_TTL is also expiry order. Entries drop out once the token
+    would have expired anyway; if the list is full the oldest revocation is
+    evicted. Lookups never reorder it.
+
+    The list lives in process memory: a revocation only takes effect in the
+    worker that handled it and is forgotten on restart. With several workers
+    (WEB_CONCURRENCY > 1) a revoked token keeps working on the others until
+    it expires, so keep SESSION_TTL short.
+    """
+
+    def __init__(self, maxsize: int = REVOKED_TOKENS_MAX):
+        self.maxsize = maxsize
+        self._items = OrderedDict()  # jti -> exp
+        self._lock = threading.Lock()
+
+    def add(self, jti: str, exp: int):
+        now = time.time()
+        with self._lock:
+            self._items[jti] = exp
+            self._items.move_to_end(jti)
+            self._evict(now)
+
+    def __contains__(self, jti: str) -> bool:
+        with self._lock:
+            exp = self._items.get(jti)
+            if exp is None:
+                return False
+            if exp <= time.time():
+                del self._items[jti]
+                return False
+            return True
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _evict(self, now: float):
+        # Expired entries cluster at the front since TTLs are uniform
+        while self._items:
+            jti, exp = next(iter(self._items.items()))
+            if exp > now and len(self._items) <= self.maxsize:
+                break
+            self._items.popitem(last=False)
+
+
+revoked = RevokedTokens()
+
+
+# -----------------------------
+# Tokens
+# -----------------------------
+def issue_token(user_id: int, ttl: int = SESSION_TTL) -> str:
+    """Return a signed `<payload>.<signature>` token for `user_id`."""
+    claims = {"uid": user_id, "exp": int(time.time()) + ttl, "jti": secrets.token_urlsafe(12)}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> dict | None:
+    """Return the token's claims, or None if it is forged, expired or revoked."""
+    payload, _, signature = token.partition(".")
+    if not signature or not _signature_matches(payload, signature):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) <= time.time() or claims.get("jti") in revoked:
+        return None
+    return claims
+
+
+def revoke_token(token: str) -> bool:
+    claims = verify_token(token)
+    if claims is None:
+        return False
+    revoked.add(claims["jti"], claims["exp"])
+    return True
+
+
+# -----------------------------
+# FastAPI dependencies
+# -----------------------------
+def bearer_token(authorization: str | None = Header(None)) -> str:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Missing session token")
+    return authorization[7:].strip()
+
+
+def current_session(authorization: str | None = Header(None)) -> dict:
+    """Dependency resolving the caller's claims without a database lookup."""
+    claims = verify_token(bearer_token(authorization))
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return claims
+
+
+def require_user(user_id: int, authorization: str | None = Header(None)) -> dict:
+    """Dependency for `/{user_id}` routes: the token must belong to that user."""
+    claims = current_session(authorization)
+    if claims["uid"] != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed for this user")
+    return claims
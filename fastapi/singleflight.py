@@ -0,0 +1,64 @@
+import asyncio
+import functools
+
+
+class SingleFlight:
+    """
+    Shares one in-flight call among concurrent identical calls.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it runs await the same task and get the same result object (treat
+    it as read-only) or the same exception. Nothing is cached: once the task
+    finishes, the next call runs again. A caller that is cancelled does not
+    cancel the shared call for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.merged = 0
+        self._inflight = {}  # key -> task
+
+    async def do(self, key, fn, *args, **kwargs):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            self.merged += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+# module.qualname -> group, for metrics only; each wrapper holds its own
+groups: dict[str, SingleFlight] = {}
+
+
+def single_flight(fn):
+    """
+    Decorator for read helpers: concurrent calls with equal arguments share
+    one query. Do not use on helpers that run inside a transaction, since the
+    shared call runs in its own task and so on its own connection.
+    """
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    group = groups[name] = SingleFlight(name)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        return await group.do(key, fn, *args, **kwargs)
+
+    wrapper.single_flight = group
+    return wrapper
+
+
+def stats() -> dict:
+    return {name: {"calls": g.calls, "merged": g.merged} for name, g in groups.items()}
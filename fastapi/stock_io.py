@@ -0,0 +1,174 @@
+import asyncio
+import codecs
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from database import connection as db_connection, transaction
+from cache import catalog_cache
+from holds import HeldAboveStock
+import queries as q
+
+# Rows per COPY into the staging table
+IMPORT_BATCH_ROWS = int(os.getenv("STOCK_IMPORT_BATCH_ROWS", "10000"))
+# Export chunks buffered ahead of a slow client
+EXPORT_QUEUE_CHUNKS = 16
+
+IMPORT_COLUMNS = ["line", "stock_id", "name", "description", "price", "quantity"]
+
+
+class ImportRowError(Exception):
+    """A line of the upload could not be parsed; nothing has been written."""
+
+    def __init__(self, line: int, message: str):
+        self.line = line
+        super().__init__(f"line {line}: {message}")
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+async def iter_lines(stream):
+    """Decode an async byte stream into text lines without buffering it all."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_csv(stream):
+    """Yield (line number, dict) per CSV record; the first row is the header."""
+    header = None
+    record, start, number = "", 0, 0
+    async for line in iter_lines(stream):
+        number += 1
+        if not record:
+            start = number
+        record += line
+        # A quoted field may contain newlines: wait until the quotes balance
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield start, dict(zip(header, values))
+    if record:
+        raise ImportRowError(start, "unterminated quoted field")
+
+
+async def iter_ndjson(stream):
+    number = 0
+    async for line in iter_lines(stream):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ImportRowError(number, e.msg) from None
+
+
+def parse_row(number: int, row: dict) -> tuple:
+    try:
+        stock_id = row.get("stock_id")
+        stock_id = int(stock_id) if stock_id not in (None, "") else None
+        name = row["name"]
+        if not name:
+            raise ValueError("name is empty")
+        try:
+            price = Decimal(str(row["price"]))
+        except InvalidOperation:
+            raise ValueError(f"invalid price {row['price']!r}") from None
+        quantity = int(row.get("quantity") or 0)
+    except KeyError as e:
+        raise ImportRowError(number, f"missing column {e.args[0]!r}") from None
+    except (ValueError, TypeError) as e:
+        raise ImportRowError(number, str(e) or "invalid value") from None
+    return number, stock_id, name, row.get("description") or "", price, quantity
+
+
+# -----------------------------
+# Import
+# -----------------------------
+async def import_stock(stream, format: str) -> dict:
+    """
+    Load a CSV or NDJSON upload into stock in one transaction: rows are
+    parsed as they arrive, COPYed into a temp staging table in batches and
+    applied with a single upsert. Memory use is bounded by one batch.
+    """
+    records = iter_csv(stream) if format == "csv" else iter_ndjson(stream)
+    rows = 0
+    async with db_connection() as connection:
+        conn = connection.raw_connection
+        async with transaction():
+            await conn.execute(q.CREATE_STOCK_IMPORT.sql)
+            batch = []
+            async for number, record in records:
+                batch.append(parse_row(number, record))
+                if len(batch) >= IMPORT_BATCH_ROWS:
+                    await conn.copy_records_to_table("stock_import", records=batch, columns=IMPORT_COLUMNS)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                await conn.copy_records_to_table("stock_import", records=batch, columns=IMPORT_COLUMNS)
+                rows += len(batch)
+            await conn.fetchval(q.SYNC_STOCK_SEQUENCE.sql)
+            await conn.execute(q.LOCK_IMPORTED_STOCK.sql)
+            result = await conn.fetchrow(q.APPLY_STOCK_IMPORT.sql)
+            if result["overheld"]:
+                raise HeldAboveStock(result["overheld"])  # rolls the import back
+
+    catalog_cache.invalidate()
+    return {"rows": rows, "inserted": result["inserted"], "updated": result["updated"]}
+
+
+# -----------------------------
+# Export
+# -----------------------------
+async def export_stock(format: str):
+    """
+    Stream the catalog with COPY ... TO STDOUT. The COPY runs in a task that
+    feeds a small queue, so a slow client pauses the COPY instead of the
+    export piling up in memory.
+    """
+    if format == "csv":
+        query, options = q.EXPORT_STOCK_CSV, {"format": "csv", "header": True}
+    else:
+        # One JSON object per row. Delimiter and quote are bytes that never
+        # occur in JSON text, so CSV mode writes each value out verbatim.
+        query, options = q.EXPORT_STOCK_NDJSON, {"format": "csv", "delimiter": "\x02", "quote": "\x01"}
+
+    chunks = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    done = object()
+
+    async with db_connection() as connection:
+        async def produce():
+            try:
+                await connection.raw_connection.copy_from_query(query, output=chunks.put, **options)
+            except asyncio.CancelledError:
+                raise  # the client is gone; nobody reads the queue any more
+            except Exception:
+                await chunks.put(done)
+                raise
+            await chunks.put(done)
+
+        task = asyncio.create_task(produce())
+        try:
+            while (chunk := await chunks.get()) is not done:
+                yield chunk
+            await task  # surface COPY errors
+        finally:
+            # On a client disconnect the COPY may still be running: stop it
+            # and wait, so the connection is idle before it goes back to the pool
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
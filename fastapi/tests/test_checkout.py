@@ -0,0 +1,69 @@
+import asyncio
+import uuid
+
+import pytest
+
+from checkout import place_order, CheckoutError
+from database import register_user, insert_address, insert_stock, query_one
+import queries as q
+
+pytestmark = pytest.mark.anyio
+
+BUYERS = 20
+UNITS = 5
+
+
+async def test_parallel_checkouts_never_oversell(db):
+    """BUYERS concurrent one-unit orders for a SKU with UNITS left: exactly UNITS succeed."""
+    user = await register_user(f"buyer-{uuid.uuid4().hex}@example.com", "x", "Test", "Buyer")
+    address = await insert_address(user["user_id"], "1 Test St", "Testville", "10000", "TH")
+    stock = await insert_stock("Oversell probe", "checkout test", 10.0, UNITS)
+    stock_id = stock["stock_id"]
+
+    lowest = UNITS
+    done = asyncio.Event()
+
+    async def watch():
+        nonlocal lowest
+        while not done.is_set():
+            row = await query_one(q.GET_STOCK, stock_id=stock_id)
+            lowest = min(lowest, row["quantity"])
+            await asyncio.sleep(0)
+
+    async def buy():
+        return await place_order(
+            user["user_id"], address["id"], 10.0, [{"stock_id": stock_id, "quantity": 1, "price": 10.0}]
+        )
+
+    watcher = asyncio.create_task(watch())
+    results = await asyncio.gather(*(buy() for _ in range(BUYERS)), return_exceptions=True)
+    done.set()
+    await watcher
+
+    orders = [r for r in results if not isinstance(r, BaseException)]
+    failures = [r for r in results if isinstance(r, BaseException)]
+    assert len(orders) == UNITS
+    assert all(isinstance(f, CheckoutError) and f.short == [stock_id] for f in failures)
+
+    row = await query_one(q.GET_STOCK, stock_id=stock_id)
+    assert row["quantity"] == 0
+    assert lowest >= 0
+
+
+async def test_overlapping_carts_do_not_deadlock(db):
+    """Carts naming the same SKUs in opposite orders all go through."""
+    user = await register_user(f"buyer-{uuid.uuid4().hex}@example.com", "x", "Test", "Buyer")
+    address = await insert_address(user["user_id"], "1 Test St", "Testville", "10000", "TH")
+    skus = [(await insert_stock(f"Deadlock probe {i}", "checkout test", 10.0, BUYERS))["stock_id"] for i in range(3)]
+
+    async def buy(order):
+        items = [{"stock_id": stock_id, "quantity": 1, "price": 10.0} for stock_id in order]
+        return await place_order(user["user_id"], address["id"], 30.0, items)
+
+    carts = [skus if i % 2 else skus[::-1] for i in range(BUYERS)]
+    results = await asyncio.gather(*(buy(cart) for cart in carts), return_exceptions=True)
+
+    assert not [r for r in results if isinstance(r, BaseException)]
+    for stock_id in skus:
+        row = await query_one(q.GET_STOCK, stock_id=stock_id)
+        assert row["quantity"] == 0
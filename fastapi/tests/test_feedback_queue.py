@@ -0,0 +1,69 @@
+import asyncio
+import uuid
+
+import asyncpg
+import pytest
+
+import feedback_queue
+from feedback_queue import FeedbackWriter
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_batch_only_fails_the_bad_row(monkeypatch):
+    async def insert_batch(query, **values):
+        raise ValueError("batch rejected")
+
+    async def insert_one(query, user_id, rating, comment):
+        if rating > 5:
+            raise ValueError("rating out of range")
+        return {"user_id": user_id, "rating": rating, "comment": comment}
+
+    monkeypatch.setattr(feedback_queue, "query_all", insert_batch)
+    monkeypatch.setattr(feedback_queue, "query_one", insert_one)
+
+    writer = FeedbackWriter(batch_size=10, flush_interval=0.01)
+    await writer.start()
+    try:
+        results = await asyncio.gather(
+            writer.submit(1, 4, "good"),
+            writer.submit(2, 9, "bad"),
+            writer.submit(3, 5, "good"),
+            return_exceptions=True,
+        )
+    finally:
+        await writer.stop()
+
+    assert results[0] == {"user_id": 1, "rating": 4, "comment": "good"}
+    assert isinstance(results[1], ValueError)
+    assert results[2] == {"user_id": 3, "rating": 5, "comment": "good"}
+    assert writer.retried == 1
+    assert writer.written == 2
+
+
+async def test_shutdown_persists_queued_feedback(database_url):
+    """Feedback still queued when the app shuts down is written before the pool closes."""
+    from app import app
+    from database import register_user
+    from feedback_queue import feedback_writer
+    from migrate import dsn
+
+    tag = uuid.uuid4().hex
+    async with app.router.lifespan_context(app):
+        user = await register_user(f"feedback-{tag}@example.com", "x", "Test", "Reviewer")
+        submissions = [
+            asyncio.create_task(feedback_writer.submit(user["user_id"], 1 + i % 5, f"{tag}-{i}"))
+            for i in range(250)
+        ]
+        await asyncio.sleep(0.01)  # let every submission reach the queue
+
+    assert all(task.done() for task in submissions)
+    rows = [task.result() for task in submissions]
+    assert sorted(row["comment"] for row in rows) == sorted(f"{tag}-{i}" for i in range(250))
+
+    conn = await asyncpg.connect(dsn())
+    try:
+        count = await conn.fetchval("SELECT count(*) FROM feedback WHERE comment LIKE $1", f"{tag}-%")
+    finally:
+        await conn.close()
+    assert count == 250
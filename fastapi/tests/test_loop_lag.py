@@ -0,0 +1,21 @@
+import asyncio
+import time
+
+import pytest
+
+from instrumentation import LoopLagMonitor
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_blocking_the_loop_shows_up_as_lag():
+    monitor = LoopLagMonitor(interval=0.01)
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.03)
+        time.sleep(0.05)  # a synchronous call in a handler
+        await asyncio.sleep(0.03)
+    finally:
+        await monitor.stop()
+    assert monitor.lag.count >= 2
+    assert monitor.max_lag >= 0.03
@@ -0,0 +1,37 @@
+import pytest
+
+from search import TrigramIndex, trigrams
+
+NAMES = ["Falcon Scout", "Falcom Racer", "Phantom Pro", "Phantasm Mini", "Skyhawk Cargo", "Sky Hawk"]
+
+
+def build(names: list[str]) -> TrigramIndex:
+    index = TrigramIndex()
+    rows = [{"stock_id": i, "name": name} for i, name in enumerate(names, 1)]
+    index.names, index.words, index.grams, index.gram_counts = TrigramIndex._build(rows)
+    return index
+
+
+def jaccard(a: str, b: str) -> float:
+    ga, gb = trigrams(a), trigrams(b)
+    return len(ga & gb) / len(ga | gb)
+
+
+@pytest.mark.parametrize("term", ["falcin", "phantam", "skyhwak", "cargp", "fal"])
+def test_similarity_is_trigram_jaccard(term):
+    index = build(NAMES)
+    scores = index._match_word(term)
+    for word in index.words:
+        if word == term or word.startswith(term):
+            continue
+        expected = jaccard(term, word)
+        if expected >= TrigramIndex.SIMILARITY:
+            assert scores[word] == pytest.approx(expected)
+        else:
+            assert word not in scores
+
+
+def test_exact_and_prefix_scores():
+    scores = build(NAMES)._match_word("falcon")
+    assert scores["falcon"] == 1.0
+    assert build(NAMES)._match_word("sky")["skyhawk"] == 0.95
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from sessions import RevokedTokens, issue_token, verify_token, current_session
+
+
+def test_round_trip():
+    claims = verify_token(issue_token(42))
+    assert claims["uid"] == 42
+
+
+@pytest.mark.parametrize("token", ["", "no-signature", "abc.déf", "café.sig", "ÿÿ.ÿ"])
+def test_malformed_tokens_are_rejected(token):
+    assert verify_token(token) is None
+
+
+def test_non_ascii_bearer_token_is_401():
+    with pytest.raises(HTTPException) as excinfo:
+        current_session("Bearer été.été")
+    assert excinfo.value.status_code == 401
+
+
+def test_tampered_signature_is_rejected():
+    payload, _, signature = issue_token(1).partition(".")
+    last = "A" if signature[-1] != "A" else "B"
+    assert verify_token(f"{payload}.{signature[:-1]}{last}") is None
+
+
+def test_revocation_lookup_keeps_expiry_order():
+    revoked = RevokedTokens(maxsize=2)
+    now = int(time.time())
+    revoked.add("first", now + 10)
+    revoked.add("second", now + 20)
+    assert "first" in revoked  # a lookup must not make "first" the newest
+    revoked.add("third", now + 30)
+    assert "first" not in revoked
+    assert "second" in revoked and "third" in revoked
+
+
+def test_expired_revocations_drop_out():
+    revoked = RevokedTokens()
+    revoked.add("old", int(time.time()) - 1)
+    assert "old" not in revoked
+    assert len(revoked) == 0
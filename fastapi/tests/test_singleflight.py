@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from singleflight import single_flight
+
+pytestmark = pytest.mark.anyio
+
+CALLERS = 50
+
+
+async def test_concurrent_callers_share_one_call():
+    calls = 0
+    release = asyncio.Event()
+
+    @single_flight
+    async def load_counted(key):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"key": key, "call": calls}
+
+    callers = [asyncio.create_task(load_counted("a")) for _ in range(CALLERS)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers)
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert results[0] == {"key": "a", "call": 1}
+    assert load_counted.single_flight.merged == CALLERS - 1
+
+    # Nothing is cached: a later call runs again
+    assert (await load_counted("a"))["call"] == 2
+
+
+async def test_different_arguments_do_not_merge():
+    calls = []
+
+    @single_flight
+    async def load_by_key(key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        return key
+
+    assert await asyncio.gather(load_by_key(1), load_by_key(2), load_by_key(1)) == [1, 2, 1]
+    assert sorted(calls) == [1, 2]
+
+
+async def test_callers_share_the_exception():
+    calls = 0
+
+    @single_flight
+    async def load_failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        raise LookupError("boom")
+
+    results = await asyncio.gather(*(load_failing() for _ in range(CALLERS)), return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(result, LookupError) for result in results)
+
+
+def make_loader(tag):
+    @single_flight
+    async def load(key):
+        await asyncio.sleep(0)
+        return (tag, key)
+
+    return load
+
+
+async def test_same_named_helpers_do_not_share_calls():
+    load_a, load_b = make_loader("a"), make_loader("b")
+    assert load_a.__qualname__ == load_b.__qualname__
+    assert await asyncio.gather(load_a(1), load_b(1)) == [("a", 1), ("b", 1)]
@@ -0,0 +1,49 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import stock_io
+
+pytestmark = pytest.mark.anyio
+
+
+def fake_connection(events: list):
+    class Raw:
+        async def copy_from_query(self, query, output, **options):
+            try:
+                for _ in range(1000):
+                    await output(b"row\n")
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.01)  # asyncpg needs a moment to abort the COPY
+                events.append("copy stopped")
+                raise
+
+    class Connection:
+        raw_connection = Raw()
+
+    @asynccontextmanager
+    async def connection():
+        try:
+            yield Connection()
+        finally:
+            events.append("released")
+
+    return connection
+
+
+async def test_disconnect_stops_copy_before_releasing_connection(monkeypatch):
+    events = []
+    monkeypatch.setattr(stock_io, "db_connection", fake_connection(events))
+    export = stock_io.export_stock("csv")
+    await export.__anext__()
+    await export.aclose()  # the client went away mid-export
+    assert events == ["copy stopped", "released"]
+
+
+async def test_full_export_streams_every_chunk(monkeypatch):
+    events = []
+    monkeypatch.setattr(stock_io, "db_connection", fake_connection(events))
+    chunks = [chunk async for chunk in stock_io.export_stock("ndjson")]
+    assert len(chunks) == 1000
+    assert events == ["released"]
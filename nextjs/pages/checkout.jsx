@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { Box, Button, Typography, IconButton, Stack, TextField, Paper, Divider } from "@mui/material";
 import CloseIcon from "@mui/icons-material/Close";
 import Swal from "sweetalert2";
@@ -60,6 +60,9 @@ export default function Checkout() {
   const [loading, setLoading] = useState(false);
   const [orderSuccess, setOrderSuccess] = useState(false);
   const [orderId, setOrderId] = useState(null);
+  // One key per order attempt: retries after a timeout reuse it, so the
+  // server returns the first result instead of placing the order twice
+  const idempotencyKey = useRef(null);
 
   const total_price = cart.reduce((sum, item) => sum + item.price * item.quantity, 0);
 
@@ -78,23 +81,41 @@ export default function Checkout() {
     // Fetch address from backend if user exists
     if (storedUser) {
       const userObj = JSON.parse(storedUser);
-      fetch(`http://localhost:8000/api/address/${userObj.user_id}`)
+      // Keep the cart's stock holds alive while the page is open
+      fetch(`http://localhost:8000/cart/${userObj.user_id}?touch=true`).catch(err => console.error(err));
+      fetch(`http://localhost:8000/api/checkout-context/${userObj.user_id}`)
         .then(res => res.json())
         .then(data => {
-          if (data && data.length > 0) setAddress(data[0]); // Use first address
+          if (data && data.address) setAddress(data.address); // Default address
         })
         .catch(err => console.error(err));
     }
   }, []);
 
+  const holdItem = (stock_id, quantity) => {
+    if (!user) return Promise.resolve(true);
+    return fetch(`http://localhost:8000/cart/${user.user_id}/items/${stock_id}`, {
+      method: "PUT",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ quantity }),
+    }).then(res => res.ok);
+  };
+
   const handleDeleteItem = (stock_id) => {
+    holdItem(stock_id, 0);
+    idempotencyKey.current = null;
     const updatedCart = cart.filter(item => item.stock_id !== stock_id);
     setCart(updatedCart);
     localStorage.setItem("cart", JSON.stringify(updatedCart));
   };
 
-  const handleQtyChange = (stock_id, qty) => {
+  const handleQtyChange = async (stock_id, qty) => {
     if (qty < 1 || isNaN(qty)) return;
+    if (!(await holdItem(stock_id, qty))) {
+      Swal.fire({ title: "Oops!", text: "Not enough stock left for this drone.", icon: "warning" });
+      return;
+    }
+    idempotencyKey.current = null;
     const updatedCart = cart.map(item => item.stock_id === stock_id ? { ...item, quantity: qty } : item);
     setCart(updatedCart);
     localStorage.setItem("cart", JSON.stringify(updatedCart));
@@ -118,10 +139,11 @@ export default function Checkout() {
     }
 
     setLoading(true);
+    if (!idempotencyKey.current) idempotencyKey.current = crypto.randomUUID();
     try {
       const res = await fetch("http://localhost:8000/order/", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey.current },
         body: JSON.stringify({
           user_id: user.user_id,
           address_id: address.id,
@@ -138,6 +160,7 @@ export default function Checkout() {
       if (!res.ok) throw new Error(result.detail || "Checkout failed");
 
       // Clear cart
+      idempotencyKey.current = null;
       localStorage.removeItem("cart");
       setCart([]);
       setOrderSuccess(true);
@@ -19,7 +19,7 @@ export default function Feedback() {
   const fetchFeedbacks = async () => {
     setLoading(true);
     try {
-      const res = await fetch("http://localhost:8000/feedback/"); // FastAPI endpoint
+      const res = await fetch("http://localhost:8000/feedback/feed?limit=50"); // latest page only
       const data = await res.json();
       console.log("Fetched feedbacks:", data);
 
@@ -69,7 +69,20 @@ export default function Home() {
     return true;
   });
 
-  const handleAddToCart = (drone, qty) => {
+  // Hold the units on the server so they cannot sell out before checkout
+  const holdItem = async (stock_id, quantity) => {
+    const user = localStorage.getItem("user");
+    if (!user) return true;
+    const { user_id } = JSON.parse(user);
+    const res = await fetch(`http://localhost:8000/cart/${user_id}/items/${stock_id}`, {
+      method: "PUT",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ quantity }),
+    });
+    return res.ok;
+  };
+
+  const handleAddToCart = async (drone, qty) => {
     if (!qty || qty < 1) {
       Swal.fire("Error", "Please enter a valid quantity", "error");
       return;
@@ -78,25 +91,22 @@ export default function Home() {
       Swal.fire("Oops!", `Only ${drone.quantity} left in stock.`, "warning");
       return;
     }
-    setCart((prev) => {
-      const existing = prev.find((item) => item.stock_id === drone.stock_id);
-      let updatedCart;
-      if (existing) {
-        const newQty = existing.quantity + qty;
-        if (newQty > drone.quantity) {
-          Swal.fire("Oops!", `Cannot add more than ${drone.quantity}`, "warning");
-          return prev;
-        }
-        updatedCart = prev.map((item) =>
-          item.stock_id === drone.stock_id ? { ...item, quantity: newQty } : item
-        );
-      } else {
-        updatedCart = [...prev, { ...drone, quantity: qty }];
-      }
-      localStorage.setItem("cart", JSON.stringify(updatedCart));
-      Swal.fire("Added!", `${qty} item(s) added to cart`, "success");
-      return updatedCart;
-    });
+    const existing = cart.find((item) => item.stock_id === drone.stock_id);
+    const newQty = existing ? existing.quantity + qty : qty;
+    if (!(await holdItem(drone.stock_id, newQty))) {
+      Swal.fire("Oops!", "Not enough stock left for this drone.", "warning");
+      return;
+    }
+    const updatedCart = existing
+      ? cart.map((item) => (item.stock_id === drone.stock_id ? { ...item, quantity: newQty } : item))
+      : [...cart, { ...drone, quantity: qty }];
+    setCart(updatedCart);
+    localStorage.setItem("cart", JSON.stringify(updatedCart));
+    // Held units leave the shown quantity
+    setDrones((prev) =>
+      prev.map((d) => (d.stock_id === drone.stock_id ? { ...d, quantity: d.quantity - qty } : d))
+    );
+    Swal.fire("Added!", `${qty} item(s) added to cart`, "success");
   };
 
   return (
@@ -41,7 +41,7 @@ export default function Login() {
       // Store user info
       localStorage.setItem(
         "user",
-        JSON.stringify({ email: result.email, user_id: result.user_id })
+        JSON.stringify({ email: result.email, user_id: result.user_id, token: result.token })
       );
 
       await Swal.fire({ title: "Success!", text: result.message, icon: "success" });
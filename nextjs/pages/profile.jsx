@@ -25,13 +25,13 @@ export default function Profile() {
 
   const fetchAddresses = async (user_id) => {
     try {
-      const res = await fetch(`http://localhost:8000/api/address/${user_id}`);
+      const res = await fetch(`http://localhost:8000/api/checkout-context/${user_id}`);
       if (!res.ok) throw new Error("Failed to fetch addresses");
       const data = await res.json();
-      setAddresses(data);
 
-      if (data.length > 0) {
-        const addr = data[0];
+      if (data.address) {
+        const addr = data.address;
+        setAddresses([addr]);
         setNewAddress({
           street: addr.street,
           city: addr.city,
@@ -41,6 +41,7 @@ export default function Profile() {
         setOriginalAddress(addr);
         setEditMode(false); // always start in read-only
       } else {
+        setAddresses([]);
         setEditMode(true); // new user: start in edit mode
       }
     } catch (err) {
@@ -74,22 +75,12 @@ export default function Profile() {
 
       const payload = { ...newAddress, user_id: user.user_id };
 
-      let res;
-      if (originalAddress) {
-        // Update existing
-        res = await fetch(`http://localhost:8000/api/address/${user.user_id}`, {
-          method: "PUT",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify(payload),
-        });
-      } else {
-        // Create new address
-        res = await fetch(`http://localhost:8000/api/address`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify(payload),
-        });
-      }
+      // Creates the default address or replaces it
+      const res = await fetch(`http://localhost:8000/api/address/${user.user_id}`, {
+        method: "PUT",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(payload),
+      });
 
       if (!res.ok) throw new Error("Failed to save address");
       const updated = await res.json();